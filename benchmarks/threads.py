@@ -0,0 +1,119 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+"""Benchmark the scaling of pyfdb calls across threads.
+
+Archives the test data into a temporary FDB, then runs list and retrieve calls from thread pools of
+increasing size, each thread using its own FDB handle. Run it once with the compiled bindings (see
+pyfdb._build) and once with PYFDB_ABI_MODE=1 to compare both modes, or pass --compare to do both:
+
+    python -m pyfdb._build
+    python benchmarks/threads.py --compare
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+DATA = Path(__file__).resolve().parent.parent / "tests" / "data"
+
+REQUEST = {
+    "class": "rd",
+    "date": "20191110",
+    "domain": "g",
+    "expver": "xxxx",
+    "levelist": "300",
+    "levtype": "pl",
+    "param": "138",
+    "step": "0",
+    "stream": "oper",
+    "time": "0000",
+    "type": "an",
+}
+
+
+def config(root: str) -> dict:
+    return dict(
+        type="local",
+        engine="toc",
+        schema=str(DATA / "default_fdb_schema"),
+        spaces=[dict(handler="Default", roots=[{"path": root}])],
+    )
+
+
+def call_overhead(pyfdb, calls: int) -> float:
+    """Seconds per call of a trivial function of the C API"""
+    key = pyfdb.ffi.new("fdb_key_t**")
+    start = time.perf_counter()
+    for _ in range(calls):
+        pyfdb.lib.fdb_new_key(key)
+        pyfdb.lib.fdb_delete_key(key[0])
+    return (time.perf_counter() - start) / (2 * calls)
+
+
+def run(threads: int, iterations: int, root: str) -> float:
+    """Operations per second with `threads` threads, each listing and retrieving `iterations` times"""
+    import pyfdb
+
+    def work(_):
+        fdb = pyfdb.FDB(config(root))
+        for _ in range(iterations):
+            for _ in fdb.list(REQUEST):
+                pass
+            with fdb.retrieve(REQUEST) as reader:
+                reader.read()
+        fdb.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for _ in executor.map(work, range(threads)):
+            pass
+    return 2 * threads * iterations / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--compare", action="store_true", help="run in both API and ABI mode")
+    args = parser.parse_args()
+
+    if args.compare:
+        argv = [sys.executable, __file__, "--iterations", str(args.iterations), "--threads"]
+        argv += [str(t) for t in args.threads]
+        for abi in (False, True):
+            env = dict(os.environ)
+            env.pop("PYFDB_ABI_MODE", None)
+            if abi:
+                env["PYFDB_ABI_MODE"] = "1"
+            subprocess.run(argv, env=env, check=True)
+        return
+
+    import pyfdb
+
+    with tempfile.TemporaryDirectory() as root:
+        fdb = pyfdb.FDB(config(root))
+        fdb.archive(open(DATA / "x138-300.grib", "rb").read())
+        fdb.flush()
+        fdb.close()
+
+        print(f"{pyfdb.lib.mode} mode: {call_overhead(pyfdb, 100000) * 1e9:.0f} ns per call")
+        baseline = None
+        for threads in args.threads:
+            rate = run(threads, args.iterations, root)
+            baseline = baseline or rate
+            print(f"  {threads:3d} threads: {rate:10.1f} operations/s, speedup {rate / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -44,4 +44,5 @@ Locating the FDB5 library:
 See https://github.com/ecmwf/pyfdb for more information on pyfdb.
 """
 
+from .batch import Batch
 from .pyfdb import *
@@ -0,0 +1,72 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+"""Build compiled bindings to the FDB5 library.
+
+By default pyfdb loads the FDB5 library at runtime with cffi's ABI mode, which needs no compiler.
+When a C compiler is available, the bindings can instead be compiled (cffi's API mode) into the
+extension module `pyfdb._fdb_cffi`, which has a lower overhead per call into the library:
+
+    python -m pyfdb._build [path/to/libfdb5.so]
+
+The extension is linked against the FDB5 library found by findlibs, or the one given. pyfdb uses it
+whenever it can be imported, and falls back to ABI mode otherwise. Setting $PYFDB_ABI_MODE to 1, true
+or yes forces ABI mode. Which mode is in use is shown by `print(pyfdb.lib)`.
+"""
+
+import os
+import sys
+import tempfile
+from typing import Optional
+
+import cffi
+import findlibs
+
+MODULE = "pyfdb._fdb_cffi"
+
+
+def ffibuilder(library: Optional[str] = None) -> cffi.FFI:
+    """The cffi builder of the compiled bindings, linked against `library`"""
+    library = library or findlibs.find("fdb5")
+    if library is None:
+        raise RuntimeError("FDB5 library not found")
+
+    with open(os.path.join(os.path.dirname(__file__), "processed_fdb.h"), "r") as f:
+        header = f.read()
+
+    builder = cffi.FFI()
+    builder.cdef(header)
+    # The header only declares the C API, so it doubles as the source of the extension
+    builder.set_source(
+        MODULE,
+        "#include <stdbool.h>\n" + header,
+        extra_link_args=[library, f"-Wl,-rpath,{os.path.dirname(os.path.abspath(library))}"],
+    )
+    return builder
+
+
+def build(library: Optional[str] = None, verbose: bool = False) -> Optional[str]:
+    """Compile the bindings next to this module
+
+    Returns:
+        str: the path of the extension module, or None if it could not be compiled.
+    """
+    target = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_fdb_cffi.*")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        try:
+            return ffibuilder(library).compile(tmpdir=tmpdir, target=target, verbose=verbose)
+        except Exception as e:
+            print(f"Could not compile the FDB5 bindings, pyfdb will use ABI mode: {e}", file=sys.stderr)
+            return None
+
+
+if __name__ == "__main__":
+    path = build(sys.argv[1] if len(sys.argv) > 1 else None, verbose=True)
+    if path is None:
+        sys.exit(1)
+    print(f"Built {path}")
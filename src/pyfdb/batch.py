@@ -0,0 +1,162 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+"""Batches of FDB operations executed together.
+
+Example:
+
+    import pyfdb
+
+    with pyfdb.Batch(max_workers=8) as batch:
+        batch.archive(fdb, data)
+        entries = batch.list(fdb, {"class": "rd", "expver": "xxxx"}, keys=True)
+        fields = [batch.retrieve(other_fdb, request) for request in requests]
+
+    print(entries.result(), [f.result() for f in fields])
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Optional
+
+from .pyfdb import FDB, _normalise_request
+
+
+class _Operation:
+    __slots__ = ("fdb", "kind", "request", "args", "kwargs", "future")
+
+    def __init__(self, fdb: FDB, kind: str, request: Optional[dict], args: tuple, kwargs: dict):
+        self.fdb = fdb
+        self.kind = kind
+        self.request = request
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+class Batch:
+    """Collects list, retrieve and archive operations, and executes them together
+
+    Operations return futures, which are resolved by `execute` (called on leaving a `with` block).
+    Operations are grouped by FDB handle, kind and database, where the database of an operation is
+    given by the values of `database_keys` in its request. The operations of a group run one after
+    the other on the same handle, so that the database is opened once for the group.
+
+    Archives run first, one handle at a time. Each handle is then flushed if `flush` is set, so that
+    the list and retrieve operations of the batch see the archived data. List and retrieve groups then
+    run concurrently, each worker thread reading through its own handle (see FDB).
+
+    Args:
+        max_workers (int): maximum number of groups executed concurrently.
+        database_keys (tuple[str]): the keys identifying a database in the FDB schema.
+        flush (bool): whether to flush the handles which archived data before listing and retrieving.
+    """
+
+    DATABASE_KEYS = ("class", "expver", "stream", "date", "time", "domain")
+
+    def __init__(self, max_workers: int = 4, database_keys: tuple = DATABASE_KEYS, flush: bool = True):
+        self.max_workers = max_workers
+        self.database_keys = database_keys
+        self.flush = flush
+        self.__operations = []
+
+    def list(self, fdb: FDB, request: Optional[dict] = None, **kwargs) -> Future:
+        """Add `fdb.list(request, **kwargs)`, resolving to the list of its entries"""
+        return self.__add(_Operation(fdb, "list", request, (request,), kwargs))
+
+    def retrieve(self, fdb: FDB, request: dict) -> Future:
+        """Add `fdb.retrieve(request)`, resolving to the retrieved bytes"""
+        return self.__add(_Operation(fdb, "retrieve", request, (request,), {}))
+
+    def archive(self, fdb: FDB, data: bytes, request: Optional[dict] = None, key: Optional[dict] = None) -> Future:
+        """Add `fdb.archive(data, request, key)`, resolving to None once archived (and flushed)"""
+        identifying = key if isinstance(key, dict) else request if isinstance(request, dict) else None
+        return self.__add(_Operation(fdb, "archive", identifying, (data,), dict(request=request, key=key)))
+
+    def execute(self) -> None:
+        """Execute the operations added since the last call, resolving their futures"""
+        operations, self.__operations = self.__operations, []
+
+        groups = {}
+        for op in operations:
+            groups.setdefault((id(op.fdb), op.kind, self.__database(op.request)), []).append(op)
+        # Groups of the same database are executed close together
+        ordered = sorted(groups.items(), key=lambda item: (item[0][2], item[0][0], item[0][1]))
+
+        archives = {}
+        for (handle, kind, _), group in ordered:
+            if kind == "archive":
+                archives.setdefault(handle, []).extend(group)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            wait([executor.submit(self.__archive, group) for group in archives.values()])
+            groups = [group for (_, kind, _), group in ordered if kind != "archive"]
+            wait([executor.submit(self.__read, group) for group in groups])
+
+    def __add(self, op: _Operation) -> Future:
+        self.__operations.append(op)
+        return op.future
+
+    def __database(self, request: Optional[dict]) -> tuple:
+        if request is None:
+            return ()
+        normalised = _normalise_request(request)
+        return tuple("/".join(normalised.get(k, [])) for k in self.database_keys)
+
+    def __archive(self, group: list) -> None:
+        fdb = group[0].fdb
+        done = []
+        for op in group:
+            if not op.future.set_running_or_notify_cancel():
+                continue
+            try:
+                fdb.archive(*op.args, **op.kwargs)
+                done.append(op)
+            except BaseException as e:
+                op.future.set_exception(e)
+
+        try:
+            if done and self.flush:
+                fdb.flush()
+        except BaseException as e:
+            for op in done:
+                op.future.set_exception(e)
+        else:
+            for op in done:
+                op.future.set_result(None)
+
+    def __read(self, group: list) -> None:
+        fdb = group[0].fdb
+        for op in group:
+            if not op.future.set_running_or_notify_cancel():
+                continue
+            try:
+                if op.kind == "list":
+                    result = [el for el in fdb.list(*op.args, **op.kwargs)]
+                else:
+                    with fdb.retrieve(*op.args) as reader:
+                        result = reader.read()
+                op.future.set_result(result)
+            except BaseException as e:
+                op.future.set_exception(e)
+
+    def __len__(self):
+        return len(self.__operations)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.execute()
+        else:
+            for op in self.__operations:
+                op.future.cancel()
+            self.__operations = []
+
+    def __repr__(self):
+        return f"<pyfdb.batch.Batch {len(self)} operations, max_workers={self.max_workers}>"
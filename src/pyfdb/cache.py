@@ -0,0 +1,469 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+"""Caches for retrieved data.
+
+A cache is attached to an FDB with `FDB(config, cache=...)` (or by setting `fdb.cache`), after which
+`FDB.retrieve` serves repeated requests from the cache. Caches implement two methods:
+
+    get(key: str) -> file-like object or None
+    put(key: str, data: bytes-like or readable binary file object) -> file-like object
+
+where `key` is a digest of the normalised request and of the FDB configuration. On a cache miss,
+`FDB.retrieve` passes the data reader itself to `put`, so that the data can be streamed into the cache
+rather than read into memory first. Empty data is not stored.
+"""
+
+import fcntl
+import hashlib
+import io
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+
+class DiskCache:
+    """Size-bounded cache of retrieved data on the local filesystem, with least-recently-used eviction
+
+    Entries are written atomically, so that the cache directory may be shared by concurrent processes.
+    The last access time of an entry is tracked through its modification time. The total size of the
+    entries is kept in a file of the cache directory, so that the directory is only scanned when the
+    cache outgrows `max_bytes`.
+
+    Usage:
+        import pyfdb.cache
+        fdb = pyfdb.FDB(cache=pyfdb.cache.DiskCache("/path/to/cache", max_bytes=10 * 1024**3))
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Optional[BinaryIO]:
+        path = self.__entry(key)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process in the meantime. The open file remains readable.
+            pass
+        return f
+
+    def put(self, key: str, data) -> BinaryIO:
+        path = self.__entry(key)
+        path.parent.mkdir(exist_ok=True)
+
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                size = _write(f, data)
+            # Open before publishing the entry, so that it cannot be evicted before it is read
+            result = open(tmp, "rb")
+            if size:
+                with _FileLock(self.path / ".lock"):
+                    try:
+                        size -= os.stat(path).st_size
+                    except FileNotFoundError:
+                        pass
+                    os.replace(tmp, path)
+                    self.__add(size)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        return result
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache fits within `max_bytes`"""
+        with _FileLock(self.path / ".lock"):
+            self.__evict()
+
+    def __add(self, size: int) -> None:
+        # Called with the lock held
+        try:
+            total = int((self.path / ".size").read_text()) + size
+        except (FileNotFoundError, ValueError):
+            # Unknown, e.g. a cache written before sizes were tracked
+            total = self.max_bytes + 1
+        if total > self.max_bytes:
+            self.__evict()
+        else:
+            self.__store_total(total)
+
+    def __evict(self) -> None:
+        entries = []
+        total = 0
+        for subdir in os.scandir(self.path):
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.__store_total(total)
+
+    def __store_total(self, total: int) -> None:
+        tmp = self.path / ".size.tmp"
+        tmp.write_text(str(total))
+        os.replace(tmp, self.path / ".size")
+
+    def clear(self) -> None:
+        """Remove all entries from the cache"""
+        max_bytes, self.max_bytes = self.max_bytes, 0
+        try:
+            self.evict()
+        finally:
+            self.max_bytes = max_bytes
+
+    def __entry(self, key: str) -> Path:
+        return self.path / key[:2] / key
+
+    def __repr__(self):
+        return f"<pyfdb.cache.DiskCache {self.path} max_bytes={self.max_bytes}>"
+
+
+class SharedMemoryCache:
+    """Size-bounded cache of retrieved data in shared memory, shared between the processes of a node
+
+    Each entry is held in a `multiprocessing.shared_memory` segment named after the request, so that
+    data retrieved by one process is served to the others without being read again. The returned
+    `SharedField` objects expose the data zero-copy through their `buffer` attribute.
+
+    Entries outlive the fields, and the processes, which use them: they are removed by least-recently-used
+    eviction once the cache exceeds `max_bytes`, or by `clear`. The names and sizes of the entries are
+    tracked in an index file next to `lock_path`. Removing an entry does not invalidate the fields still
+    open on it, as the memory of a segment is only freed once no process maps it.
+
+    An entry being written is marked with the pid of its writer and its creation time. If the writer dies
+    before completing it, or takes longer than `stale_after` seconds, the entry is reclaimed by the next
+    process accessing it.
+
+    Usage:
+        import pyfdb.cache
+        fdb = pyfdb.FDB(cache=pyfdb.cache.SharedMemoryCache(prefix="pp", max_bytes=4 * 1024**3))
+        with fdb.retrieve(request) as field:
+            values = decode(field.buffer)
+    """
+
+    # Segment header: ready flag, pid of the writer, data length, creation and last access times
+    HEADER = struct.Struct("<IIQdd")
+
+    # Shared memory names are limited to 31 characters (including a leading "/") on macOS. Names are
+    # made of the prefix and of at least 16 hexadecimal digits (64 bits) of a digest of the key.
+    NAME_LENGTH = 30
+    MIN_DIGEST_LENGTH = 16
+
+    def __init__(
+        self,
+        prefix: str = "pyfdb",
+        lock_path: Optional[Union[str, os.PathLike]] = None,
+        max_bytes: int = 1024**3,
+        stale_after: float = 300,
+    ):
+        if len(prefix) + 1 + self.MIN_DIGEST_LENGTH > self.NAME_LENGTH:
+            raise ValueError(
+                f"Shared memory cache prefix {prefix!r} is too long, "
+                f"at most {self.NAME_LENGTH - 1 - self.MIN_DIGEST_LENGTH} characters are allowed"
+            )
+        self.prefix = prefix
+        self.lock_path = Path(lock_path or Path(tempfile.gettempdir()) / f"{prefix}.shm.lock")
+        self.index_path = self.lock_path.with_name(self.lock_path.name + ".index")
+        self.max_bytes = max_bytes
+        self.stale_after = stale_after
+
+    def get(self, key: str) -> Optional["SharedField"]:
+        name = self.__name(key)
+        with self.__lock():
+            try:
+                segment = _open_segment(name)
+            except FileNotFoundError:
+                return None
+
+            ready, pid, length, created, _ = self.HEADER.unpack_from(segment.buf)
+            if not ready:
+                if self.__stale(pid, created):
+                    self.__remove(name, segment)
+                # Otherwise still being written by another process
+                segment.close()
+                return None
+
+            self.HEADER.pack_into(segment.buf, 0, ready, pid, length, created, time.time())
+        return SharedField(self, segment, length)
+
+    def put(self, key: str, data) -> Union["SharedField", BinaryIO]:
+        name = self.__name(key)
+        if hasattr(data, "readinto") and hasattr(data, "size"):
+            # A data reader, read directly into the segment
+            length = data.size()
+        else:
+            data = data.read() if hasattr(data, "read") else data
+            length = memoryview(data).nbytes
+        if not length:
+            return io.BytesIO()
+
+        with self.__lock():
+            segment = self.__create(name, length)
+
+        if segment is None:
+            # Another process got there first. Use its copy if it is complete.
+            field = self.get(key)
+            return field if field is not None else io.BytesIO(data.read() if hasattr(data, "read") else data)
+
+        try:
+            with segment.buf[self.HEADER.size : self.HEADER.size + length] as view:
+                if _write(view, data) != length:
+                    raise EOFError(f"Expected {length} bytes of data")
+        except BaseException:
+            with self.__lock():
+                self.__remove(name, segment)
+            segment.close()
+            raise
+
+        with self.__lock():
+            _, pid, _, created, _ = self.HEADER.unpack_from(segment.buf)
+            self.HEADER.pack_into(segment.buf, 0, 1, pid, length, created, time.time())
+            self.__evict(keep=name)
+        return SharedField(self, segment, length)
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache fits within `max_bytes`"""
+        with self.__lock():
+            self.__evict()
+
+    def clear(self) -> None:
+        """Remove all entries from the cache"""
+        max_bytes, self.max_bytes = self.max_bytes, -1
+        try:
+            self.evict()
+        finally:
+            self.max_bytes = max_bytes
+
+    def __create(self, name: str, length: int) -> Optional[shared_memory.SharedMemory]:
+        size = self.HEADER.size + length
+        try:
+            segment = _open_segment(name, create=True, size=size)
+        except FileExistsError:
+            segment = _open_segment(name)
+            ready, pid, _, created, _ = self.HEADER.unpack_from(segment.buf)
+            if ready or not self.__stale(pid, created):
+                segment.close()
+                return None
+            # Left incomplete by a writer which died, reclaim it
+            self.__remove(name, segment)
+            segment.close()
+            segment = _open_segment(name, create=True, size=size)
+
+        now = time.time()
+        self.HEADER.pack_into(segment.buf, 0, 0, os.getpid(), length, now, now)
+        index = self.__read_index()
+        index[name] = size
+        self.__write_index(index)
+        return segment
+
+    def __stale(self, pid: int, created: float) -> bool:
+        return not _alive(pid) or time.time() - created > self.stale_after
+
+    def __evict(self, keep: Optional[str] = None) -> None:
+        index = self.__read_index()
+        total = sum(index.values())
+        if total <= self.max_bytes:
+            return
+
+        entries = []
+        for name in list(index):
+            try:
+                segment = _open_segment(name)
+            except FileNotFoundError:
+                # Removed outside of the cache, e.g. on reboot
+                total -= index.pop(name)
+                continue
+            ready, pid, _, created, accessed = self.HEADER.unpack_from(segment.buf)
+            if name != keep and (ready or self.__stale(pid, created)):
+                entries.append((accessed, name, segment))
+            else:
+                segment.close()
+
+        entries.sort(key=lambda entry: entry[0])
+        for _, name, segment in entries:
+            if total > self.max_bytes:
+                _unlink_segment(segment)
+                total -= index.pop(name)
+            segment.close()
+        self.__write_index(index)
+
+    def __remove(self, name: str, segment: shared_memory.SharedMemory) -> None:
+        _unlink_segment(segment)
+        index = self.__read_index()
+        if index.pop(name, None) is not None:
+            self.__write_index(index)
+
+    def __read_index(self) -> dict:
+        try:
+            with open(self.index_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def __write_index(self, index: dict) -> None:
+        tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, self.index_path)
+
+    def __name(self, key: str) -> str:
+        digest = hashlib.sha256(f"{self.prefix}/{key}".encode()).hexdigest()
+        return f"{self.prefix}_{digest[: self.NAME_LENGTH - len(self.prefix) - 1]}"
+
+    def __lock(self):
+        return _FileLock(self.lock_path)
+
+    def __repr__(self):
+        return f"<pyfdb.cache.SharedMemoryCache prefix={self.prefix} max_bytes={self.max_bytes}>"
+
+
+class SharedField(io.RawIOBase):
+    """Read-only file-like view of an entry of a SharedMemoryCache
+
+    The data is available without copies through `buffer`. Closing the field unmaps the shared memory
+    segment; views of `buffer` must not be used afterwards.
+    """
+
+    def __init__(self, cache: SharedMemoryCache, segment: shared_memory.SharedMemory, length: int):
+        self.__segment = segment
+        self.__position = 0
+        self.buffer = segment.buf[cache.HEADER.size : cache.HEADER.size + length]
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        chunk = self.buffer[self.__position : self.__position + len(view)]
+        view[: len(chunk)] = chunk
+        self.__position += len(chunk)
+        return len(chunk)
+
+    def seek(self, where, whence=io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            where += self.__position
+        elif whence == io.SEEK_END:
+            where += len(self.buffer)
+        self.__position = max(0, where)
+        return self.__position
+
+    def tell(self) -> int:
+        return self.__position
+
+    def size(self) -> int:
+        return len(self.buffer)
+
+    def close(self):
+        if not self.closed:
+            self.buffer.release()
+            try:
+                self.__segment.close()
+            except BufferError:
+                # Views of the data are still held by the caller. The mapping is released with them.
+                pass
+        super().close()
+
+
+def _write(destination, data, chunk_size: int = 16 * 1024 * 1024) -> int:
+    """Write bytes, or the content of a readable file object, to a file or into a memoryview
+
+    File objects are copied in chunks through a single buffer. Returns the number of bytes written.
+    """
+    if not hasattr(data, "read"):
+        if isinstance(destination, memoryview):
+            destination[:] = memoryview(data).cast("B")
+        else:
+            destination.write(data)
+        return memoryview(data).nbytes
+
+    if isinstance(destination, memoryview):
+        written = 0
+        while written < len(destination) and (n := data.readinto(destination[written:])):
+            written += n
+        return written
+
+    buffer = bytearray(min(chunk_size, data.size()) if hasattr(data, "size") else chunk_size)
+    written = 0
+    with memoryview(buffer) as view:
+        while n := data.readinto(view):
+            destination.write(view[:n])
+            written += n
+    return written
+
+
+class _FileLock:
+    def __init__(self, path: Path):
+        self.path = path
+
+    def __enter__(self):
+        self.file = open(self.path, "ab")
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.file.close()
+
+
+def _open_segment(name: str, create: bool = False, size: int = 0) -> shared_memory.SharedMemory:
+    """Open a shared memory segment whose lifetime is managed by the cache, not by this process"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, create=create, size=size, track=False)
+
+    segment = shared_memory.SharedMemory(name, create=create, size=size)
+    # Before Python 3.13 the resource tracker unlinks segments when the process which used them exits
+    resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _unlink_segment(segment: shared_memory.SharedMemory) -> None:
+    if sys.version_info < (3, 13):
+        # Balance the unregistration performed by unlink(), as the segment is not tracked
+        resource_tracker.register(segment._name, "shared_memory")
+    segment.unlink()
@@ -0,0 +1,108 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+"""Writers of listings to jsonl, csv or parquet files, used by `FDB.export_list`.
+
+Parquet output requires pyarrow.
+"""
+
+import abc
+import bz2
+import csv
+import gzip
+import json
+import lzma
+from typing import Iterator, Optional
+
+from .pyfdb import FDBException
+
+
+class ListWriter(abc.ABC):
+    """Writes batches of compact list entries to a file, for FDB.export_list"""
+
+    COLUMNS = ("path", "offset", "length")
+
+    def __init__(self, path, compression, columns):
+        self.columns = columns
+        self.file = None
+        if path is not None:
+            opener = {None: open, "gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}.get(compression)
+            if opener is None:
+                raise ValueError(f"Unsupported compression {compression}, expected gzip, bz2 or xz")
+            self.file = opener(path, "wt", newline="")
+
+    @staticmethod
+    def create(path, format: str, compression: Optional[str], batch) -> "ListWriter":
+        keys = {}
+        for el in batch:
+            for k in el["keys"]:
+                keys[k] = None
+        writer = {"jsonl": JsonLinesWriter, "csv": CsvWriter, "parquet": ParquetWriter}[format]
+        return writer(path, compression, ListWriter.COLUMNS + tuple(keys))
+
+    def rows(self, batch) -> Iterator[list]:
+        keys = self.columns[len(self.COLUMNS) :]
+        known = set(keys)
+        for el in batch:
+            if not known.issuperset(el["keys"]):
+                raise FDBException(
+                    f"Entry {el} has keys not found in the first entries exported, use the jsonl format instead"
+                )
+            yield [el.path, el.offset, el.length] + [el["keys"].get(k) for k in keys]
+
+    @abc.abstractmethod
+    def write(self, batch) -> None:
+        """Write a batch of compact list entries"""
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class JsonLinesWriter(ListWriter):
+    def write(self, batch) -> None:
+        self.file.write(
+            "".join(
+                json.dumps({"path": el.path, "offset": el.offset, "length": el.length, "keys": dict(el["keys"])}) + "\n"
+                for el in batch
+            )
+        )
+
+
+class CsvWriter(ListWriter):
+    def __init__(self, path, compression, columns):
+        super().__init__(path, compression, columns)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, batch) -> None:
+        self.writer.writerows(self.rows(batch))
+
+
+class ParquetWriter(ListWriter):
+    def __init__(self, path, compression, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("Exporting to parquet requires pyarrow") from e
+
+        super().__init__(None, None, columns)
+        self.pyarrow = pyarrow
+        types = [pyarrow.string(), pyarrow.uint64(), pyarrow.uint64()] + [pyarrow.string()] * (
+            len(columns) - len(self.COLUMNS)
+        )
+        self.schema = pyarrow.schema(list(zip(columns, types)))
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression=compression or "snappy")
+
+    def write(self, batch) -> None:
+        columns = zip(*self.rows(batch))
+        arrays = [self.pyarrow.array(values, type=field.type) for values, field in zip(columns, self.schema)]
+        self.writer.write_table(self.pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
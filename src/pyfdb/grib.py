@@ -0,0 +1,162 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+"""Archive GRIB data with keys extracted in Python.
+
+This module requires eccodes. Compared to `FDB.archive(data)`, which lets the FDB library derive the
+key of each message, `pyfdb.grib.archive` extracts the keys of all messages before archiving any of
+them. This allows the keys to be validated against a request up front, so that a mismatching
+message fails the whole call instead of leaving a partially archived file. Keys are cached on the
+metadata sections of the messages, so repeated metadata is only decoded once.
+
+Example:
+
+    import pyfdb.grib
+
+    keys = pyfdb.grib.archive(open("data.grib", "rb").read(), request={"class": "rd", ...}, fdb=fdb)
+"""
+
+from collections import OrderedDict
+from typing import Optional
+
+import eccodes
+
+from . import pyfdb as _pyfdb
+from .pyfdb import FDB, FDBException, _normalise_request, _scan_grib
+
+
+class KeyExtractor:
+    """Extracts the FDB keys of GRIB messages, caching them on the bytes of the metadata sections
+
+    Args:
+        cache_size (int): maximum number of distinct metadata sections remembered.
+    """
+
+    def __init__(self, cache_size: int = 4096):
+        self.cache_size = cache_size
+        self.__cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def extract(self, data) -> list[tuple[int, int, dict[str, str]]]:
+        """Return (offset, length, keys) for each GRIB message in a buffer of concatenated messages"""
+        view = memoryview(data)
+        return [(offset, length, self.keys(view[offset : offset + length])) for offset, length in _scan_grib(data)]
+
+    def keys(self, message: memoryview) -> dict[str, str]:
+        """The FDB key of a single GRIB message"""
+        header = bytes(_metadata_sections(message))
+        keys = self.__cache.get(header)
+        if keys is not None:
+            self.hits += 1
+            self.__cache.move_to_end(header)
+            return keys
+
+        self.misses += 1
+        keys = _decode_keys(message)
+        self.__cache[header] = keys
+        if len(self.__cache) > self.cache_size:
+            self.__cache.popitem(last=False)
+        return keys
+
+
+def archive(
+    data,
+    request: Optional[dict] = None,
+    fdb: Optional[FDB] = None,
+    extractor: Optional[KeyExtractor] = None,
+) -> list[dict[str, str]]:
+    """Archive concatenated GRIB messages with keys extracted in Python
+
+    Args:
+        data: bytes-like object containing concatenated GRIB messages.
+        request (dict, optional): if given, the key of every message must match the request.
+        fdb (FDB, optional): the FDB to archive into. Defaults to the module level FDB.
+        extractor (KeyExtractor, optional): extractor to use, so that its cache is reused across calls.
+
+    Raises:
+        FDBException: if the data is not entirely made of GRIB messages, or if any message does not match
+            the request. Nothing is archived in either case.
+
+    Returns:
+        list[dict]: the key of each archived message.
+    """
+    if fdb is None:
+        if _pyfdb.fdb is None:
+            _pyfdb.fdb = FDB()
+        fdb = _pyfdb.fdb
+
+    extractor = extractor if extractor is not None else KeyExtractor()
+    messages = extractor.extract(data)
+    _check_coverage(messages, memoryview(data).nbytes)
+
+    if request is not None:
+        validate(request, [keys for _, _, keys in messages])
+
+    view = memoryview(data)
+    for offset, length, keys in messages:
+        fdb.archive(view[offset : offset + length], key=keys)
+    return [keys for _, _, keys in messages]
+
+
+def validate(request: dict, keys: list[dict[str, str]]) -> None:
+    """Check that each key matches the request, raising FDBException listing the mismatches otherwise"""
+    expected = _normalise_request(request)
+    mismatches = []
+    for index, key in enumerate(keys):
+        for name, values in expected.items():
+            if key.get(name) not in values:
+                mismatches.append(f"message {index}: {name}={key.get(name)} not in {'/'.join(values)}")
+
+    if mismatches:
+        raise FDBException("Data does not match the request: " + "; ".join(mismatches))
+
+
+def _check_coverage(messages: list[tuple[int, int, dict[str, str]]], size: int) -> None:
+    """Check that the messages make up the whole buffer, raising FDBException on unrecognised bytes"""
+    if not messages:
+        raise FDBException(f"No GRIB messages found in {size} bytes of data")
+
+    position = 0
+    for offset, length, _ in messages + [(size, 0, None)]:
+        if offset != position:
+            raise FDBException(f"Data is not GRIB: {offset - position} unrecognised bytes at offset {position}")
+        position = offset + length
+
+
+def _metadata_sections(message: memoryview) -> memoryview:
+    """The sections of a GRIB message from which its key is derived, i.e. all sections before the data"""
+    if message[7] == 1:
+        # GRIB1: the product definition section
+        return message[8 : 8 + int.from_bytes(message[8:11], "big")]
+
+    # GRIB2: sections 1 to 4, up to the data representation section
+    end = 16
+    while end + 5 <= len(message) and message[end + 4] < 5:
+        end += int.from_bytes(message[end : end + 4], "big")
+    return message[16:end]
+
+
+def _decode_keys(message: memoryview) -> dict[str, str]:
+    handle = eccodes.codes_new_from_message(message)
+    try:
+        keys = {}
+        iterator = eccodes.codes_keys_iterator_new(handle, "mars")
+        try:
+            while eccodes.codes_keys_iterator_next(iterator):
+                name = eccodes.codes_keys_iterator_get_name(iterator)
+                keys[name] = eccodes.codes_get(handle, name, str)
+        finally:
+            eccodes.codes_keys_iterator_delete(iterator)
+
+        # The FDB identifies parameters by their paramId, e.g. 138 rather than 138.128
+        if "param" in keys:
+            keys["param"] = eccodes.codes_get(handle, "paramId", str)
+        return keys
+    finally:
+        eccodes.codes_release(handle)
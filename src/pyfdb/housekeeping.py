@@ -0,0 +1,133 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+"""Concurrent wipe and purge over many databases.
+
+Example:
+
+    from pyfdb.housekeeping import HousekeepingExecutor
+
+    executor = HousekeepingExecutor(fdb, max_workers=8, progress=print)
+    estimate = executor.estimate({"class": "rd", "expver": "xxxx"}, purge=True)
+    report = executor.purge({"class": "rd", "expver": "xxxx"}, doit=True)
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
+
+from .pyfdb import FDB, HousekeepingReport
+
+
+class Progress:
+    """Progress of a HousekeepingExecutor run, passed to the progress callback after each database
+
+    Attributes:
+        total (int): number of databases to process.
+        done (int): number of databases processed.
+        bytes (int): size of the field data in the databases wiped (wipe only).
+        duplicate_bytes (int): size of the duplicated fields found, or purged (purge only).
+    """
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.bytes = 0
+        self.duplicate_bytes = 0
+        self.start = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    @property
+    def databases_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        """Bytes wiped, or duplicate bytes purged, per second"""
+        elapsed = self.elapsed
+        return (self.bytes + self.duplicate_bytes) / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return (
+            f"<pyfdb.housekeeping.Progress {self.done}/{self.total} databases, {self.bytes} bytes, "
+            f"{self.duplicate_bytes} duplicate bytes, {self.databases_per_second:.1f} databases/s, "
+            f"{self.bytes_per_second:.0f} bytes/s>"
+        )
+
+
+class HousekeepingExecutor:
+    """Runs wipe and purge concurrently, one database at a time per worker
+
+    The request is split into one request per database, found by listing at depth 1. Each worker uses
+    its own FDB handle, created with the configuration of `fdb`.
+
+    Args:
+        fdb (FDB): the FDB to operate on.
+        max_workers (int): maximum number of databases processed concurrently.
+        progress (callable, optional): called with a Progress object after each database.
+    """
+
+    def __init__(self, fdb: FDB, max_workers: int = 4, progress: Optional[Callable[[Progress], None]] = None):
+        self.fdb = fdb
+        self.max_workers = max_workers
+        self.progress = progress
+        self.__local = threading.local()
+
+    def databases(self, request: dict) -> list[dict]:
+        """The requests selecting each of the databases matching `request`"""
+        return [dict(request, **el["keys"]) for el in self.fdb.list(request, keys=True, depth=1)]
+
+    def estimate(self, request: dict, purge: bool = False) -> HousekeepingReport:
+        """Dry run of a wipe (or purge), reporting what would be deleted"""
+        if purge:
+            return self.purge(request, doit=False)
+        return self.wipe(request, doit=False)
+
+    def wipe(self, request: dict, doit: bool = False, unsafeWipeAll: bool = False) -> HousekeepingReport:
+        """Wipe the databases matching the request. See FDB.wipe."""
+
+        def wipe(fdb: FDB, r: dict) -> tuple[HousekeepingReport, int]:
+            # The output of a wipe gives no sizes, so the field data is measured by listing it beforehand
+            size = sum(length for (length,) in fdb.list(r, duplicates=True, fields=["length"]))
+            return fdb.wipe(r, doit=doit, unsafeWipeAll=unsafeWipeAll), size
+
+        return self.__run(request, wipe)
+
+    def purge(self, request: dict, doit: bool = False) -> HousekeepingReport:
+        """Purge duplicates from the databases matching the request. See FDB.purge."""
+        return self.__run(request, lambda fdb, r: (fdb.purge(r, doit=doit), 0))
+
+    def __run(
+        self, request: dict, operation: Callable[[FDB, dict], tuple[HousekeepingReport, int]]
+    ) -> HousekeepingReport:
+        shards = self.databases(request)
+        progress = Progress(len(shards))
+        reports = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(lambda r: operation(self.__handle(), r), shard) for shard in shards]
+            for future in as_completed(futures):
+                report, size = future.result()
+                reports.extend(report)
+                progress.done += 1
+                progress.bytes += size
+                progress.duplicate_bytes += report.duplicate_bytes
+                if self.progress is not None:
+                    self.progress(progress)
+
+        return HousekeepingReport(reports)
+
+    def __handle(self) -> FDB:
+        if not hasattr(self.__local, "fdb"):
+            self.__local.fdb = FDB(self.fdb.config, self.fdb.user_config)
+        return self.__local.fdb
@@ -0,0 +1,118 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+"""Decode retrieved GRIB fields straight into NumPy arrays.
+
+This module is an optional extension of pyfdb and requires numpy and eccodes.
+
+Example:
+
+    import pyfdb.numpy
+
+    values, metadata = pyfdb.numpy.retrieve({...}, fdb=fdb)
+    # values.shape == (number of fields, number of points)
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import eccodes
+import numpy as np
+
+from . import pyfdb as _pyfdb
+from .pyfdb import FDB, _scan_grib
+
+
+def retrieve(
+    request: dict,
+    fdb: Optional[FDB] = None,
+    keys: Optional[list[str]] = None,
+    dtype=np.float64,
+    max_workers: Optional[int] = None,
+) -> tuple[np.ndarray, list[dict]]:
+    """Retrieve the fields matching a request and decode them into a single array.
+
+    Args:
+        request (dict): dictionary representing the request.
+        fdb (FDB, optional): the FDB to retrieve from. Defaults to the module level FDB.
+        keys (list[str], optional): GRIB keys to extract for each field. Defaults to the MARS namespace.
+        dtype: numpy.float64 or numpy.float32, the type of the decoded values.
+        max_workers (int, optional): number of threads used for decoding.
+
+    Returns:
+        tuple[numpy.ndarray, list[dict]]: the (fields x points) values and the metadata of each field,
+        in the order in which the fields were retrieved.
+    """
+    reader = fdb.retrieve(request) if fdb is not None else _pyfdb.retrieve(request)
+    with reader:
+        data = reader.read()
+    return decode(data, keys=keys, dtype=dtype, max_workers=max_workers)
+
+
+def decode(
+    data,
+    keys: Optional[list[str]] = None,
+    dtype=np.float64,
+    max_workers: Optional[int] = None,
+) -> tuple[np.ndarray, list[dict]]:
+    """Decode a buffer of concatenated GRIB messages into a single array.
+
+    The messages are decoded in parallel, directly from views into `data`, and their values are
+    written into one preallocated output array. All fields must have the same number of points.
+
+    Args:
+        data: bytes-like object containing concatenated GRIB messages.
+        keys (list[str], optional): GRIB keys to extract for each field. Defaults to the MARS namespace.
+        dtype: numpy.float64 or numpy.float32, the type of the decoded values.
+        max_workers (int, optional): number of threads used for decoding.
+
+    Returns:
+        tuple[numpy.ndarray, list[dict]]: the (fields x points) values and the metadata of each field.
+    """
+    view = memoryview(data)
+    messages = [view[offset : offset + length] for offset, length in _scan_grib(data)]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        handles = []
+        try:
+            for handle in executor.map(eccodes.codes_new_from_message, messages):
+                handles.append(handle)
+
+            sizes = {eccodes.codes_get_size(handle, "values") for handle in handles}
+            if len(sizes) > 1:
+                raise ValueError(f"Cannot stack fields with differing numbers of points: {sorted(sizes)}")
+
+            values = np.empty((len(handles), sizes.pop() if sizes else 0), dtype=dtype)
+            ktype = np.float32 if values.dtype == np.float32 else float
+
+            def decode_field(index: int) -> dict:
+                handle = handles[index]
+                values[index] = eccodes.codes_get_values(handle, ktype)
+                return _metadata(handle, keys)
+
+            metadata = [m for m in executor.map(decode_field, range(len(handles)))]
+        finally:
+            for handle in handles:
+                eccodes.codes_release(handle)
+
+    return values, metadata
+
+
+def _metadata(handle, keys: Optional[list[str]]) -> dict:
+    if keys is not None:
+        return {key: eccodes.codes_get(handle, key, str) for key in keys}
+
+    metadata = {}
+    iterator = eccodes.codes_keys_iterator_new(handle, "mars")
+    try:
+        while eccodes.codes_keys_iterator_next(iterator):
+            key = eccodes.codes_keys_iterator_get_name(iterator)
+            metadata[key] = eccodes.codes_get(handle, key, str)
+    finally:
+        eccodes.codes_keys_iterator_delete(iterator)
+    return metadata
@@ -7,11 +7,19 @@
 # nor does it submit to any jurisdiction.
 
 import builtins
+import errno
+import hashlib
 import io
 import json
+import mmap
 import os
+import re
+import sys
+import threading
+import time
+from collections.abc import Mapping
 from functools import wraps
-from typing import Optional, overload
+from typing import BinaryIO, Iterator, Optional, Union, overload
 
 import cffi
 import findlibs
@@ -21,29 +29,59 @@ from .version import __version__
 
 __fdb_version__ = "5.12.1"
 
-ffi = cffi.FFI()
+# Finding the library also loads its dependencies, on which the compiled bindings rely
+_library_path = findlibs.find("fdb5")
+
+try:
+    if os.environ.get("PYFDB_ABI_MODE", "").strip().lower() in ("1", "true", "yes"):
+        raise ImportError("ABI mode requested")
+    # Compiled bindings, see pyfdb._build
+    from ._fdb_cffi import ffi
+    from ._fdb_cffi import lib as _compiled_lib
+except ImportError:
+    ffi = cffi.FFI()
+    _compiled_lib = None
 
 
 class FDBException(RuntimeError):
-    pass
+    """An error reported by the FDB library
+
+    Attributes:
+        code (int): the error code returned by the library, if any.
+        function (str): the function of the C API which failed, if any.
+    """
+
+    def __init__(self, message: str, code: Optional[int] = None, function: Optional[str] = None):
+        super().__init__(message)
+        self.code = code
+        self.function = function
 
 
 class PatchedLib:
     """
     Patch a CFFI library with error handling
 
-    Finds the header file associated with the FDB C API and parses it, loads the shared library,
-    and patches the accessors with automatic python-C error handling.
+    Uses the compiled bindings when they have been built (API mode). Otherwise finds the header file
+    associated with the FDB C API and parses it, and loads the shared library (ABI mode). In both
+    cases, patches the accessors with automatic python-C error handling.
+
+    The unpatched functions are available as `raw`, for hot paths which check return values themselves
+    and raise `error(retval, name)`.
     """
 
     def __init__(self):
-        self.path = findlibs.find("fdb5")
+        self.path = _library_path
 
-        if self.path is None:
-            raise RuntimeError("FDB5 library not found")
+        if _compiled_lib is not None:
+            self.mode = "API"
+            self.__lib = _compiled_lib
+        else:
+            if self.path is None:
+                raise RuntimeError("FDB5 library not found")
 
-        ffi.cdef(self.__read_header())
-        self.__lib = ffi.dlopen(self.path)
+            self.mode = "ABI"
+            ffi.cdef(self.__read_header())
+            self.__lib = ffi.dlopen(self.path)
 
         # All of the executable members of the CFFI-loaded library are functions in the FDB
         # C API. These should be wrapped with the correct error handling. Otherwise forward
@@ -61,6 +99,8 @@ class PatchedLib:
 
         self.fdb_initialise()
 
+        self.raw = self.__lib
+
         # Check the library version
 
         tmp_str = ffi.new("char**")
@@ -86,23 +126,214 @@ class PatchedLib:
         def wrapped_fn(*args, **kwargs):
             retval = fn(*args, **kwargs)
             if retval != self.__lib.FDB_SUCCESS and retval != self.__lib.FDB_ITERATION_COMPLETE:
-                error_str = "Error in function {}: {}".format(
-                    name,
-                    ffi.string(self.__lib.fdb_error_string(retval)).decode("utf-8", "backslashreplace"),
-                )
-                raise FDBException(error_str)
+                raise self.error(retval, name)
             return retval
 
         return wrapped_fn
 
+    def error(self, retval: int, name: str) -> FDBException:
+        """The exception for an error code returned by the function `name` of the C API"""
+        message = ffi.string(self.__lib.fdb_error_string(retval)).decode("utf-8", "backslashreplace")
+        return FDBException(f"Error in function {name}: {message} (error code {retval})", retval, name)
+
     def __repr__(self):
-        return f"<pyfdb.pyfdb.PatchedLib FDB5 version {self.version} from {self.path}>"
+        return f"<pyfdb.pyfdb.PatchedLib FDB5 version {self.version} from {self.path} ({self.mode} mode)>"
 
 
 # Bootstrap the library
 
 lib = PatchedLib()
 
+# Unpatched functions, for hot paths which check return values themselves
+_raw = lib.raw
+
+# Counts of live C objects by type, when leak tracking is enabled
+_live_handles = {} if os.environ.get("PYFDB_TRACK_HANDLES") else None
+_live_handles_lock = threading.Lock()
+
+
+def track_handles(enabled: bool = True) -> None:
+    """Enable (or disable) the counting of live C objects, reported by `live_handles`
+
+    Only objects created while tracking is enabled are counted. Tracking can also be enabled from the
+    start by setting the environment variable PYFDB_TRACK_HANDLES=1.
+    """
+    global _live_handles
+    _live_handles = {} if enabled else None
+
+
+def live_handles() -> dict[str, int]:
+    """The number of live C objects by type, e.g. {"fdb_datareader_t": 2}, if tracking is enabled"""
+    if _live_handles is None:
+        return {}
+    with _live_handles_lock:
+        return {kind: count for kind, count in _live_handles.items() if count}
+
+
+def _managed(cdata, destructor, kind: str):
+    """Attach the destructor of a C object, counting it if leak tracking is enabled"""
+    counts = _live_handles
+    if counts is None:
+        return ffi.gc(cdata, destructor)
+
+    with _live_handles_lock:
+        counts[kind] = counts.get(kind, 0) + 1
+
+    def release(c):
+        with _live_handles_lock:
+            counts[kind] -= 1
+        destructor(c)
+
+    return ffi.gc(cdata, release)
+
+
+class _NoOpSpan:
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def add_event(self, name: str, attributes: Optional[dict] = None) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NO_OP_SPAN = _NoOpSpan()
+
+# Tracer receiving the spans of FDB operations, None when tracing is disabled
+_tracer = None
+
+
+def set_tracer(tracer=None) -> None:
+    """Emit spans for FDB operations to a tracer, or stop emitting them if `tracer` is None
+
+    The tracer must implement the `start_as_current_span` and `start_span` methods of the OpenTelemetry
+    Tracer API, e.g. `pyfdb.set_tracer(opentelemetry.trace.get_tracer("pyfdb"))`. Spans are named
+    "pyfdb.<operation>", and carry the request as "fdb.request.<key>" attributes and data volumes as
+    "fdb.bytes". Retrievals additionally emit a "pyfdb.retrieve.transfer" span from the first read to
+    the closing of the DataRetriever, with a "first_byte" event.
+    """
+    global _tracer
+    _tracer = tracer
+
+
+def _span(name: str, request=None, attributes: Optional[dict] = None):
+    """Context manager of a span of the current tracer, made current. A no-op when tracing is disabled."""
+    if _tracer is None:
+        return _NO_OP_SPAN
+    return _tracer.start_as_current_span(name, attributes=_span_attributes(request, attributes))
+
+
+def _start_span(name: str, request=None, attributes: Optional[dict] = None):
+    """A span of the current tracer which is ended explicitly. A no-op when tracing is disabled."""
+    if _tracer is None:
+        return _NO_OP_SPAN
+    return _tracer.start_span(name, attributes=_span_attributes(request, attributes))
+
+
+def _span_attributes(request, attributes: Optional[dict]) -> dict:
+    result = {}
+    if isinstance(request, dict):
+        for k, v in request.items():
+            values = v if isinstance(v, (builtins.list, tuple)) else [v]
+            result[f"fdb.request.{k}"] = "/".join(str(x) for x in values)
+    result.update(attributes or {})
+    return result
+
+
+def _grib_message_length(buffer, offset: int) -> int:
+    """Decode the total length of the GRIB message starting at `offset` from its indicator section"""
+    edition = buffer[offset + 7]
+    if edition == 1:
+        length = int.from_bytes(buffer[offset + 4 : offset + 7], "big")
+        if length & 0x800000:
+            # Messages over 8 MiB may set the top bit as a flag, encoding their length in units of
+            # 120 bytes. This is marked by a binary data section shorter than 120 bytes, whose length
+            # then corrects the total (see ecCodes grib_io.c). Otherwise the length is as encoded.
+            sec1 = offset + 8
+            flags = buffer[sec1 + 7]
+            section = sec1 + int.from_bytes(buffer[sec1 : sec1 + 3], "big")
+            if flags & 0x80:
+                section += int.from_bytes(buffer[section : section + 3], "big")
+            if flags & 0x40:
+                section += int.from_bytes(buffer[section : section + 3], "big")
+            sec4len = int.from_bytes(buffer[section : section + 3], "big")
+            if sec4len < 120:
+                length = (length & 0x7FFFFF) * 120 - sec4len + 4
+        return length
+    if edition == 2:
+        return int.from_bytes(buffer[offset + 8 : offset + 16], "big")
+    return 0
+
+
+_GRIB = re.compile(b"GRIB")
+
+
+def _scan_grib(buffer, start: int = 0) -> Iterator[tuple[int, int]]:
+    """Yield (offset, length) for each complete GRIB message in a buffer of concatenated messages
+
+    The buffer may be any bytes-like object. Scanning stops at the first message which is not fully
+    contained in the buffer, so that callers reading a stream incrementally can resume from the end
+    of the last yielded message.
+    """
+    buffer = memoryview(buffer).cast("B")
+    end = len(buffer)
+    match = _GRIB.search(buffer, start)
+    while match is not None and match.start() + 16 <= end:
+        offset = match.start()
+        length = _grib_message_length(buffer, offset)
+        if length >= 16 and offset + length > end:
+            return
+        if length >= 16 and buffer[offset + length - 4 : offset + length] == b"7777":
+            yield offset, length
+            offset += length
+        else:
+            offset += 4
+        match = _GRIB.search(buffer, offset)
+
+
+def _batches(messages, max_bytes: int) -> Iterator[tuple[int, int, int]]:
+    """Group (offset, length) messages into (start, end, count) ranges of contiguous messages of at most max_bytes"""
+    start = end = None
+    count = 0
+    for offset, length in messages:
+        if start is not None and (offset != end or offset + length - start > max_bytes):
+            yield start, end, count
+            start = None
+        if start is None:
+            start = offset
+            count = 0
+        end = offset + length
+        count += 1
+    if start is not None:
+        yield start, end, count
+
+
+def _normalise_request(request: dict) -> dict[str, builtins.list[str]]:
+    """Normalise the names and values of a request, without changing the order of the values
+
+    Values are split as passed to the FDB library (see `_encode_values`), so that equivalent requests,
+    e.g. with values given as a range, a NumPy array or a "/"-separated string, are normalised alike.
+    """
+    normalised = {}
+    for name, values in request.items():
+        name = str(name).strip().lower()
+        if not name or name == "verb":
+            continue
+        normalised[name] = [v.decode("ascii").strip() for v in _encode_values(values)]
+    return dict(sorted(normalised.items()))
+
+
+def _request_digest(request: dict, salt: str = "") -> str:
+    encoded = json.dumps([salt, _normalise_request(request)]).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
 
 class Key:
     __key = None
@@ -111,7 +342,7 @@ class Key:
         key = ffi.new("fdb_key_t**")
         lib.fdb_new_key(key)
         # Set free function
-        self.__key = ffi.gc(key[0], lib.fdb_delete_key)
+        self.__key = _managed(key[0], lib.fdb_delete_key, "fdb_key_t")
 
         for k, v in keys.items():
             self.set(k, v)
@@ -128,36 +359,79 @@ class Key:
         return self.__key
 
 
+# Keys whose ranges of integers are expanded by the MARS "to/by" syntax to the same values. Dates are
+# excluded: "to/by" steps through calendar days, unlike a range of integers spanning the end of a month.
+_RANGE_KEYS = frozenset(("step", "levelist", "number"))
+
+
+def _encode_values(values, ranges: bool = False) -> builtins.list[bytes]:
+    """The values of a request key as ASCII strings
+
+    Values may be a string, an int, a range, a sequence or a NumPy array. Strings of several values
+    separated by "/" are split. If `ranges` is set, ranges are encoded in the MARS "to/by" syntax,
+    which is resolved by the expansion of the request, rather than value by value. This is only valid
+    for the keys in `_RANGE_KEYS`.
+    """
+    if isinstance(values, range):
+        if ranges and len(values) > 2 and values.step > 0:
+            return [b"%d" % values.start, b"to", b"%d" % values[-1], b"by", b"%d" % values.step]
+    elif isinstance(values, (str, int)):
+        values = [values]
+    elif hasattr(values, "tolist"):
+        # NumPy arrays and scalars
+        values = values.tolist()
+        values = values if isinstance(values, builtins.list) else [values]
+
+    encoded = []
+    for value in values:
+        if isinstance(value, str):
+            if "/" in value:
+                encoded.extend(v.encode("ascii") for v in value.split("/"))
+            else:
+                encoded.append(value.encode("ascii"))
+        elif isinstance(value, int):
+            encoded.append(b"%d" % value)
+        else:
+            encoded.append(str(value).encode("ascii"))
+    return encoded
+
+
 class Request:
+    """A request in the form passed to the FDB library
+
+    Args:
+        request (dict): the values of each key of the request. See `value`.
+        ranges (bool): encode ranges of the keys supporting it in the MARS "to/by" syntax. Only valid if
+            the request is expanded.
+    """
+
     __request = None
 
-    def __init__(self, request):
+    def __init__(self, request, ranges: bool = False):
         newrequest = ffi.new("fdb_request_t**")
 
         # we assume a retrieve request represented as a dictionary
         lib.fdb_new_request(newrequest)
-        self.__request = ffi.gc(newrequest[0], lib.fdb_delete_request)
+        self.__request = _managed(newrequest[0], lib.fdb_delete_request, "fdb_request_t")
+        self.__ranges = ranges
 
         for name, values in request.items():
             self.value(name, values)
 
     def value(self, name, values):
+        """Set the values of a key, given as a string, an int, a range, a sequence or a NumPy array"""
         if name and name != "verb":
-            cvals = []
-            if isinstance(values, (str, int)):
-                values = [values]
-            for value in values:
-                if isinstance(value, int):
-                    value = str(value)
-                cval = ffi.new("const char[]", value.encode("ascii"))
-                cvals.append(cval)
-
-            lib.fdb_request_add(
-                self.__request,
-                ffi.new("const char[]", name.encode("ascii")),
-                ffi.new("const char*[]", cvals),
-                len(values),
-            )
+            encoded = _encode_values(values, self.__ranges and name.lower() in _RANGE_KEYS)
+
+            # All values are passed in a single buffer, as consecutive null-terminated strings
+            buffer = ffi.new("char[]", b"\0".join(encoded))
+            pointers = ffi.new("const char*[]", len(encoded))
+            offset = 0
+            for i, value in enumerate(encoded):
+                pointers[i] = buffer + offset
+                offset += len(value) + 1
+
+            lib.fdb_request_add(self.__request, name.encode("ascii"), pointers, len(encoded))
 
     def expand(self):
         lib.fdb_expand_request(self.__request)
@@ -167,63 +441,230 @@ class Request:
         return self.__request
 
 
+class EntryKeys(Mapping):
+    """Read-only mapping of the keys of a list entry
+
+    The key names are a tuple shared between all entries with the same keys, and the values are
+    interned strings, so that large listings hold little memory.
+    """
+
+    __slots__ = ("_names", "_values")
+
+    def __init__(self, names: tuple, values: tuple):
+        self._names = names
+        self._values = values
+
+    def __getitem__(self, name):
+        try:
+            return self._values[self._names.index(name)]
+        except ValueError:
+            raise KeyError(name) from None
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class ListEntry(Mapping):
+    """Compact, read-only entry of a listing, returned by `FDB.list(..., compact=True)`
+
+    Behaves as the dictionary returned otherwise, i.e. entry["path"], entry["offset"], entry["length"]
+    and entry["keys"], and also exposes these as attributes.
+    """
+
+    __slots__ = ("path", "offset", "length", "_keys")
+
+    def __init__(self, path=None, offset=None, length=None, keys=None):
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self._keys = keys
+
+    def __getitem__(self, name):
+        if name == "keys" and self._keys is not None:
+            return self._keys
+        if name in ("path", "offset", "length") and self.path is not None:
+            return getattr(self, name)
+        raise KeyError(name)
+
+    def __iter__(self):
+        if self.path is not None:
+            yield from ("path", "offset", "length")
+        if self._keys is not None:
+            yield "keys"
+
+    def __len__(self):
+        return (3 if self.path is not None else 0) + (1 if self._keys is not None else 0)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
 class ListIterator:
     __iterator = None
     __key = False
     __depth = 3
 
-    def __init__(self, fdb, request, duplicates, key=False, expand=True, depth=3):
+    def __init__(self, fdb, request, duplicates, key=False, expand=True, depth=3, compact=False, fields=None):
         iterator = ffi.new("fdb_listiterator_t**")
-        if request:
-            req = Request(request)
-            if expand:
-                req.expand()
-            lib.fdb_list(fdb.ctype, req.ctype, iterator, duplicates, depth)
-        else:
-            lib.fdb_list(fdb.ctype, ffi.NULL, iterator, duplicates, depth)
+        with _span("pyfdb.list", request, {"fdb.depth": depth}):
+            if request:
+                with _span("pyfdb.request.build"):
+                    req = Request(request, ranges=expand)
+                if expand:
+                    with _span("pyfdb.request.expand"):
+                        req.expand()
+                lib.fdb_list(fdb.thread_ctype, req.ctype, iterator, duplicates, depth)
+            else:
+                lib.fdb_list(fdb.thread_ctype, ffi.NULL, iterator, duplicates, depth)
 
         self.__depth = depth
-        self.__iterator = ffi.gc(iterator[0], lib.fdb_delete_listiterator)
+        self.__iterator = _managed(iterator[0], lib.fdb_delete_listiterator, "fdb_listiterator_t")
         self.__key = key
+        self.__compact = compact
+        self.__names = {}
+
+        self.__fields = tuple(fields) if fields is not None else None
+        if fields is not None:
+            self.__attrs = {name: i for i, name in enumerate(fields) if name in ("path", "offset", "length")}
+            self.__projected = {
+                name.encode("utf-8"): i for i, name in enumerate(fields) if name not in ("path", "offset", "length")
+            }
 
         self.path = ffi.new("const char**")
         self.off = ffi.new("size_t*")
         self.len = ffi.new("size_t*")
 
     def __next__(self) -> dict:
-        err = lib.fdb_listiterator_next(self.__iterator)
+        if self.__iterator is None:
+            raise StopIteration
+
+        err = _raw.fdb_listiterator_next(self.__iterator)
 
         if err != 0:
+            if err != lib.FDB_ITERATION_COMPLETE:
+                raise lib.error(err, "fdb_listiterator_next")
             raise StopIteration
 
+        if self.__fields is not None:
+            return self.__projection()
+
+        if self.__compact:
+            return self.__compact_entry()
+
         el = dict()
         if self.__depth == 3:
-            lib.fdb_listiterator_attrs(self.__iterator, self.path, self.off, self.len)
+            self.__attributes()
             el["path"] = ffi.string(self.path[0]).decode("utf-8")
             el["offset"] = self.off[0]
             el["length"] = self.len[0]
 
         if self.__key:
+            el["keys"] = dict(self.__split_key())
+
+        return el
+
+    def __split_key(self) -> Iterator[tuple[str, str]]:
+        splitkey = ffi.new("fdb_split_key_t**")
+        lib.fdb_new_splitkey(splitkey)
+        key = _managed(splitkey[0], lib.fdb_delete_splitkey, "fdb_split_key_t")
+
+        lib.fdb_listiterator_splitkey(self.__iterator, key)
+
+        k = ffi.new("const char**")
+        v = ffi.new("const char**")
+        level = ffi.new("size_t*")
+
+        try:
+            while (err := _raw.fdb_splitkey_next_metadata(key, k, v, level)) == 0:
+                yield ffi.string(k[0]).decode("utf-8"), ffi.string(v[0]).decode("utf-8")
+            if err != lib.FDB_ITERATION_COMPLETE:
+                raise lib.error(err, "fdb_splitkey_next_metadata")
+        finally:
+            ffi.release(key)
+
+    def __attributes(self) -> None:
+        err = _raw.fdb_listiterator_attrs(self.__iterator, self.path, self.off, self.len)
+        if err != 0:
+            raise lib.error(err, "fdb_listiterator_attrs")
+
+    def __projection(self) -> tuple:
+        values = [None] * len(self.__fields)
+
+        if self.__attrs and self.__depth == 3:
+            self.__attributes()
+            for name, i in self.__attrs.items():
+                if name == "path":
+                    values[i] = ffi.string(self.path[0]).decode("utf-8")
+                else:
+                    values[i] = self.off[0] if name == "offset" else self.len[0]
+
+        if self.__projected:
             splitkey = ffi.new("fdb_split_key_t**")
             lib.fdb_new_splitkey(splitkey)
-            key = ffi.gc(splitkey[0], lib.fdb_delete_splitkey)
-
+            key = _managed(splitkey[0], lib.fdb_delete_splitkey, "fdb_split_key_t")
             lib.fdb_listiterator_splitkey(self.__iterator, key)
 
             k = ffi.new("const char**")
             v = ffi.new("const char**")
             level = ffi.new("size_t*")
 
-            meta = dict()
-            while lib.fdb_splitkey_next_metadata(key, k, v, level) == 0:
-                meta[ffi.string(k[0]).decode("utf-8")] = ffi.string(v[0]).decode("utf-8")
-            el["keys"] = meta
+            # Only the values of the selected keys are decoded, stopping once they have all been found
+            remaining = len(self.__projected)
+            while remaining and (err := _raw.fdb_splitkey_next_metadata(key, k, v, level)) == 0:
+                i = self.__projected.get(ffi.string(k[0]))
+                if i is not None:
+                    values[i] = ffi.string(v[0]).decode("utf-8")
+                    remaining -= 1
+            ffi.release(key)
+            if remaining and err != lib.FDB_ITERATION_COMPLETE:
+                raise lib.error(err, "fdb_splitkey_next_metadata")
+
+        return tuple(values)
+
+    def __compact_entry(self) -> ListEntry:
+        entry = ListEntry()
+        if self.__depth == 3:
+            self.__attributes()
+            entry.path = sys.intern(ffi.string(self.path[0]).decode("utf-8"))
+            entry.offset = self.off[0]
+            entry.length = self.len[0]
 
-        return el
+        if self.__key:
+            names = []
+            values = []
+            for k, v in self.__split_key():
+                names.append(k)
+                values.append(sys.intern(v))
+            names = tuple(names)
+            entry._keys = EntryKeys(self.__names.setdefault(names, names), tuple(values))
+
+        return entry
 
     def __iter__(self):
         return self
 
+    def advance(self) -> bool:
+        """Move to the next entry without decoding it. Returns False once the iteration is complete."""
+        return self.__iterator is not None and lib.fdb_listiterator_next(self.__iterator) == lib.FDB_SUCCESS
+
+    def close(self):
+        """Release the underlying C iterator immediately"""
+        if self.__iterator is not None:
+            ffi.release(self.__iterator)
+            self.__iterator = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
 
 class WipeIterator:
     __iterator = None
@@ -232,15 +673,29 @@ class WipeIterator:
         iterator = ffi.new("fdb_wipe_iterator_t**")
         req = Request(request)
         lib.fdb_wipe(fdb.ctype, req.ctype, doit, porcelain, unsafeWipeAll, iterator)
-        self.__iterator = ffi.gc(iterator[0], lib.fdb_delete_wipe_iterator)
+        self.__iterator = _managed(iterator[0], lib.fdb_delete_wipe_iterator, "fdb_wipe_iterator_t")
 
     def __iter__(self):
         element = ffi.new("fdb_wipe_element_t**")
-        while lib.fdb_wipe_iterator_next(self.__iterator, element) == lib.FDB_SUCCESS:
-            self.__element = ffi.gc(element[0], lib.fdb_delete_wipe_element)
-            msg = ffi.new("const char**")
-            lib.fdb_wipe_element_string(self.__element, msg)
-            yield ffi.string(msg[0]).decode("utf-8")
+        msg = ffi.new("const char**")
+        while self.__iterator is not None and lib.fdb_wipe_iterator_next(self.__iterator, element) == lib.FDB_SUCCESS:
+            current = _managed(element[0], lib.fdb_delete_wipe_element, "fdb_wipe_element_t")
+            lib.fdb_wipe_element_string(current, msg)
+            string = ffi.string(msg[0]).decode("utf-8")
+            ffi.release(current)
+            yield string
+
+    def close(self):
+        """Release the underlying C iterator immediately"""
+        if self.__iterator is not None:
+            ffi.release(self.__iterator)
+            self.__iterator = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
 
 class PurgeIterator:
@@ -250,41 +705,201 @@ class PurgeIterator:
         iterator = ffi.new("fdb_purge_iterator_t**")
         req = Request(request)
         lib.fdb_purge(fdb.ctype, req.ctype, doit, porcelain, iterator)
-        self.__iterator = ffi.gc(iterator[0], lib.fdb_delete_purge_iterator)
+        self.__iterator = _managed(iterator[0], lib.fdb_delete_purge_iterator, "fdb_purge_iterator_t")
 
     def __iter__(self):
         element = ffi.new("fdb_purge_element_t**")
-        while lib.fdb_purge_iterator_next(self.__iterator, element) == lib.FDB_SUCCESS:
-            self.__element = ffi.gc(element[0], lib.fdb_delete_purge_element)
-            msg = ffi.new("const char**")
-            lib.fdb_purge_element_string(self.__element, msg)
-            yield ffi.string(msg[0]).decode("utf-8")
+        msg = ffi.new("const char**")
+        while self.__iterator is not None and lib.fdb_purge_iterator_next(self.__iterator, element) == lib.FDB_SUCCESS:
+            current = _managed(element[0], lib.fdb_delete_purge_element, "fdb_purge_element_t")
+            lib.fdb_purge_element_string(current, msg)
+            string = ffi.string(msg[0]).decode("utf-8")
+            ffi.release(current)
+            yield string
+
+    def close(self):
+        """Release the underlying C iterator immediately"""
+        if self.__iterator is not None:
+            ffi.release(self.__iterator)
+            self.__iterator = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class DatabaseReport:
+    """Outcome of a wipe or purge for a single database
+
+    The FDB C API only returns the database headers of a wipe: the URIs deleted (or to delete) are not
+    part of its output, the library printing them itself when deleting. The counters are those of the
+    index report of a purge, which is not produced in porcelain mode.
+
+    Attributes:
+        database (str): name of the database, e.g. "rd:xxxx:oper:20191110:0000:g".
+        owner (str): owner of the database, when reported.
+        fields (int): number of fields in the indexes of the database (purge only).
+        duplicates (int): number of duplicated fields (purge only).
+        duplicate_bytes (int): size of the duplicated fields (purge only).
+    """
+
+    def __init__(self, database: Optional[str] = None, owner: Optional[str] = None):
+        self.database = database
+        self.owner = owner
+        self.fields = 0
+        self.duplicates = 0
+        self.duplicate_bytes = 0
+
+    def __repr__(self):
+        return (
+            f"<pyfdb.pyfdb.DatabaseReport {self.database} fields={self.fields} "
+            f"duplicates={self.duplicates} duplicate_bytes={self.duplicate_bytes}>"
+        )
+
+
+class HousekeepingReport:
+    """Outcome of a wipe or purge: an iterable of DatabaseReport, with totals over all databases"""
+
+    def __init__(self, databases):
+        self.databases = [db for db in databases]
+
+    def __iter__(self):
+        return iter(self.databases)
+
+    def __len__(self):
+        return len(self.databases)
+
+    @property
+    def fields(self) -> int:
+        return sum(db.fields for db in self.databases)
+
+    @property
+    def duplicates(self) -> int:
+        return sum(db.duplicates for db in self.databases)
+
+    @property
+    def duplicate_bytes(self) -> int:
+        return sum(db.duplicate_bytes for db in self.databases)
+
+    def __repr__(self):
+        return (
+            f"<pyfdb.pyfdb.HousekeepingReport databases={len(self)} fields={self.fields} "
+            f"duplicates={self.duplicates} duplicate_bytes={self.duplicate_bytes}>"
+        )
+
+
+_DATABASE_HEADER = re.compile(r"^\[Database: (?P<database>[^,\]]*)(, FDB Owner: (?P<owner>[^\]]*))?\]$")
+_INDEX_PATH = re.compile(r"^Index \w+\(path=(?P<path>[^,)]*)")
+_STATISTIC = re.compile(r"^(?P<name>[A-Za-z ]+?)\s*:\s*(?P<value>[\d,]+)")
+_COUNTERS = {"Fields": "fields", "Duplicated fields": "duplicates", "Size of duplicates": "duplicate_bytes"}
+
+
+def _database_of(path: str) -> str:
+    return os.path.basename(os.path.dirname(re.sub(r"^file:(//)?", "", path)))
+
+
+def _parse_housekeeping(lines) -> Iterator[DatabaseReport]:
+    """Parse the output of the wipe and purge iterators into per-database reports"""
+    db = None
+
+    for line in lines:
+        text = line.strip()
+
+        header = _DATABASE_HEADER.match(text)
+        if header or text == "Index Report:":
+            if db is not None:
+                yield db
+            db = DatabaseReport(*header.group("database", "owner")) if header else DatabaseReport()
+            continue
+
+        index = _INDEX_PATH.match(text)
+        statistic = _STATISTIC.match(text)
+        if db is None or not (index or statistic):
+            continue
+        if index and db.database is None:
+            db.database = _database_of(index.group("path"))
+        if statistic and statistic.group("name") in _COUNTERS:
+            name = _COUNTERS[statistic.group("name")]
+            setattr(db, name, getattr(db, name) + int(statistic.group("value").replace(",", "")))
+
+    if db is not None:
+        yield db
+
+
+def _local_path(path: Optional[str]) -> Optional[str]:
+    """The local file of a listed path, which may be a "file://" URI, or None if it is not a local file"""
+    if path is None:
+        return None
+    path = re.sub(r"^file:(//)?", "", path)
+    return path if os.path.isfile(path) else None
+
+
+def _coalesce(ranges, max_gap: int = 0) -> Iterator[tuple[int, int, builtins.list]]:
+    """Merge (offset, length, index) ranges of a file into (start, end, members) reads, in offset order
+
+    Ranges separated by at most `max_gap` bytes are read together, the gap being read and discarded.
+    """
+    start = end = None
+    members = []
+    for offset, length, index in sorted(ranges):
+        if members and offset > end + max_gap:
+            yield start, end, members
+            members = []
+        if not members:
+            start = end = offset
+        members.append((offset, length, index))
+        end = max(end, offset + length)
+    if members:
+        yield start, end, members
 
 
 class DataRetriever(io.RawIOBase):
     __dataread = None
     __opened = False
+    __transfer = None
 
     def __init__(self, fdb, request: dict[str, str], expand: bool = True):
         dataread = ffi.new("fdb_datareader_t **")
         lib.fdb_new_datareader(dataread)
-        self.__dataread = ffi.gc(dataread[0], lib.fdb_delete_datareader)
-        req = Request(request)
-        if expand:
-            req.expand()
-        lib.fdb_retrieve(fdb.ctype, req.ctype, self.__dataread)
+        self.__dataread = _managed(dataread[0], lib.fdb_delete_datareader, "fdb_datareader_t")
+        with _span("pyfdb.retrieve", request):
+            with _span("pyfdb.request.build"):
+                req = Request(request, ranges=expand)
+            if expand:
+                with _span("pyfdb.request.expand"):
+                    req.expand()
+            lib.fdb_retrieve(fdb.thread_ctype, req.ctype, self.__dataread)
+        self.__request = request
+        self.__bytes = 0
 
     mode = "rb"
 
+    def readable(self) -> bool:
+        return True
+
     def open(self):
+        if self.__dataread is None:
+            raise ValueError(f"I/O operation on closed {self.__class__.__name__}")
         if not self.__opened:
             self.__opened = True
+            self.__transfer = _start_span("pyfdb.retrieve.transfer", self.__request)
             lib.fdb_datareader_open(self.__dataread, ffi.NULL)
 
     def close(self):
+        """Close the data stream and release the underlying C data reader immediately"""
         if self.__opened:
             self.__opened = False
             lib.fdb_datareader_close(self.__dataread)
+        if self.__dataread is not None:
+            ffi.release(self.__dataread)
+            self.__dataread = None
+        if self.__transfer is not None:
+            self.__transfer.set_attribute("fdb.bytes", self.__bytes)
+            self.__transfer.end()
+            self.__transfer = None
+        super().close()
 
     def skip(self, count):
         self.open()
@@ -311,22 +926,279 @@ class DataRetriever(io.RawIOBase):
         lib.fdb_datareader_size(self.__dataread, size)
         return size[0]
 
+    def readinto(self, buffer) -> int:
+        """Read directly into a pre-allocated writable buffer, returning the number of bytes read"""
+        self.open()
+        view = memoryview(buffer).cast("B")
+        read = ffi.new("long*")
+        err = _raw.fdb_datareader_read(self.__dataread, ffi.from_buffer(view, require_writable=True), len(view), read)
+        if err != 0:
+            raise lib.error(err, "fdb_datareader_read")
+        if not self.__bytes and read[0]:
+            self.__transfer.add_event("first_byte")
+        self.__bytes += read[0]
+        return read[0]
+
     def read(self, size=-1) -> bytes:
         self.open()
         if isinstance(size, int):
             if size == -1:
                 size = self.size()
             buf = bytearray(size)
-            read = ffi.new("long*")
-            lib.fdb_datareader_read(self.__dataread, ffi.from_buffer(buf), size, read)
-            return buf[0 : read[0]]
+            read = self.readinto(buf)
+            # Avoid copying the buffer when it has been filled completely
+            return buf if read == size else buf[0:read]
         return bytearray()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        None
+        self.close()
+
+
+class AdaptiveReader(io.RawIOBase):
+    """Reads a stream in chunks whose size is tuned to the observed throughput
+
+    Each read from the underlying stream is limited to `chunk_size`, which starts at `min_chunk_size`
+    and doubles while doing so improves the throughput by at least 10%, up to `max_chunk_size`. It
+    then stays at the size which gave the best throughput. Use it as the raw stream of an
+    io.BufferedReader whose buffer is at least `max_chunk_size`, so that small reads are buffered:
+
+        reader = io.BufferedReader(AdaptiveReader(fdb.retrieve(request)), buffer_size=64 * 1024**2)
+
+    Attributes:
+        chunk_size (int): the current size of the reads from the underlying stream.
+        bytes (int): the number of bytes read.
+        seconds (float): the time spent reading.
+    """
+
+    def __init__(
+        self,
+        source: BinaryIO,
+        min_chunk_size: int = 256 * 1024,
+        max_chunk_size: int = 64 * 1024 * 1024,
+    ):
+        self.source = source
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.chunk_size = min_chunk_size
+        self.bytes = 0
+        self.seconds = 0.0
+        self.__best = 0.0
+        self.__settled = False
+
+    @property
+    def bandwidth(self) -> float:
+        """The achieved throughput, in bytes per second"""
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        with memoryview(buffer) as view, view.cast("B") as chunk:
+            start = time.perf_counter()
+            n = self.source.readinto(chunk[: self.chunk_size])
+            self.__observe(n, time.perf_counter() - start)
+        return n
+
+    def readall(self) -> bytes:
+        data = bytearray()
+        while True:
+            end = len(data)
+            data.extend(bytes(self.chunk_size))
+            n = self.readinto(memoryview(data)[end:])
+            del data[end + n :]
+            if not n:
+                return bytes(data)
+
+    def __observe(self, n: int, seconds: float) -> None:
+        self.bytes += n
+        self.seconds += seconds
+        # Only full chunks measure the throughput of the current size
+        if self.__settled or n < self.chunk_size or seconds <= 0:
+            return
+
+        rate = n / seconds
+        if rate >= 1.1 * self.__best:
+            self.__best = rate
+            if self.chunk_size < self.max_chunk_size:
+                self.chunk_size = min(2 * self.chunk_size, self.max_chunk_size)
+                return
+        elif self.chunk_size > self.min_chunk_size:
+            # The last doubling did not pay off
+            self.chunk_size //= 2
+        self.__settled = True
+
+    def close(self):
+        self.source.close()
+        super().close()
+
+    def __repr__(self):
+        return f"<pyfdb.pyfdb.AdaptiveReader chunk_size={self.chunk_size} " f"bandwidth={self.bandwidth:.0f} bytes/s>"
+
+
+class FlushPolicy:
+    """When an FDB flushes archived data automatically
+
+    Args:
+        messages (int, optional): flush once this many messages have been archived since the last flush.
+        bytes (int, optional): flush once this many bytes have been archived since the last flush.
+        seconds (float, optional): flush on the first archive at least this many seconds after the last flush.
+        on_exit (bool): flush when leaving the FDB context manager.
+
+    Usage:
+        with pyfdb.FDB(flush_policy=pyfdb.FlushPolicy(messages=1000, seconds=60)) as fdb:
+            fdb.archive(...)
+    """
+
+    def __init__(
+        self,
+        messages: Optional[int] = None,
+        bytes: Optional[int] = None,
+        seconds: Optional[float] = None,
+        on_exit: bool = True,
+    ):
+        self.messages = messages
+        self.bytes = bytes
+        self.seconds = seconds
+        self.on_exit = on_exit
+
+    def due(self, messages: int, bytes: int, seconds: float) -> bool:
+        return (
+            (self.messages is not None and messages >= self.messages)
+            or (self.bytes is not None and bytes >= self.bytes)
+            or (self.seconds is not None and seconds >= self.seconds)
+        )
+
+    def __repr__(self):
+        return (
+            f"<pyfdb.pyfdb.FlushPolicy messages={self.messages} bytes={self.bytes} seconds={self.seconds} "
+            f"on_exit={self.on_exit}>"
+        )
+
+
+class Histogram:
+    """Counts of observed values in buckets delimited by increasing upper bounds, the last bucket being unbounded"""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+
+    def observe(self, value) -> None:
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                break
+        else:
+            i = len(self.bounds)
+        self.counts[i] += 1
+        self.total += value
+
+    def __repr__(self):
+        buckets = ", ".join(f"<={b}: {c}" for b, c in zip(self.bounds, self.counts))
+        return f"<pyfdb.pyfdb.Histogram {buckets}, >{self.bounds[-1]}: {self.counts[-1]}>"
+
+
+class FlushStatistics:
+    """Counters describing the flushes of an FDB
+
+    Attributes:
+        count (int): number of flushes.
+        bytes (Histogram): bytes archived between consecutive flushes.
+        latency (Histogram): duration of the flushes, in seconds.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = Histogram([2**n for n in range(10, 41, 5)])
+        self.latency = Histogram([0.001, 0.01, 0.1, 1.0, 10.0])
+
+    def __repr__(self):
+        return f"<pyfdb.pyfdb.FlushStatistics count={self.count} bytes={self.bytes.total} seconds={self.latency.total}>"
+
+
+class TransferStatistics:
+    """Outcome of FDB.retrieve_to
+
+    Attributes:
+        bytes (int): number of bytes written.
+        seconds (float): duration of the transfer.
+        method (str): how the data was copied: "read", "copy_file_range", "sendfile" or "pread".
+    """
+
+    def __init__(self, bytes: int, seconds: float, method: str):
+        self.bytes = bytes
+        self.seconds = seconds
+        self.method = method
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def __repr__(self):
+        return (
+            f"<pyfdb.pyfdb.TransferStatistics {self.bytes} bytes in {self.seconds:.3f}s "
+            f"({self.bytes_per_second:.0f} bytes/s, {self.method})>"
+        )
+
+
+class RetrievalEstimate:
+    """The volume of a retrieval, from FDB.estimate
+
+    Attributes:
+        fields (int): number of fields.
+        bytes (int): total size of the fields.
+        files (int): number of distinct data files holding the fields.
+        seeks (int): number of contiguous ranges read from the data files, i.e. of seeks.
+    """
+
+    def __init__(self, fields: int = 0, bytes: int = 0, files: int = 0, seeks: int = 0):
+        self.fields = fields
+        self.bytes = bytes
+        self.files = files
+        self.seeks = seeks
+
+    def __repr__(self):
+        return (
+            f"<pyfdb.pyfdb.RetrievalEstimate {self.fields} fields, {self.bytes} bytes, "
+            f"{self.files} files, {self.seeks} seeks>"
+        )
+
+
+def _copy_range(source: int, destination: int, offset: int, length: int, method: str) -> str:
+    """Copy a range of a file to the current position of another, within the kernel where supported
+
+    Tries `method` first, falling back to the next of copy_file_range, sendfile and pread when a
+    method is not supported for these files. Returns the method which succeeded.
+    """
+    methods = ["copy_file_range", "sendfile", "pread"]
+    for method in methods[methods.index(method) :]:
+        try:
+            while length:
+                if method == "copy_file_range" and hasattr(os, "copy_file_range"):
+                    n = os.copy_file_range(source, destination, length, offset)
+                elif method == "sendfile" and hasattr(os, "sendfile"):
+                    n = os.sendfile(destination, source, offset, length)
+                elif method == "pread":
+                    n = os.write(destination, os.pread(source, min(length, 64 * 1024 * 1024), offset))
+                else:
+                    break
+                if n == 0:
+                    raise FDBException("Data file is shorter than its listed entries")
+                offset += n
+                length -= n
+            else:
+                return method
+        except OSError as e:
+            if method == "pread" or e.errno not in _UNSUPPORTED_COPY:
+                raise
+    return method
+
+
+# Errors of copy_file_range and sendfile for files between which they cannot copy
+_UNSUPPORTED_COPY = (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSOCK)
 
 
 class FDB:
@@ -338,12 +1210,26 @@ class FDB:
 
     See the module level pyfdb.list, pyfdb.retrieve, and pyfdb.archive
     docstrings for more information on these functions.
+
+    A cache (see pyfdb.cache) may be given to serve repeated retrievals locally:
+        fdb = pyfdb.FDB(cache=pyfdb.cache.DiskCache("/path/to/cache", max_bytes=2**30))
+
+    A FlushPolicy may be given to flush archived data automatically. Statistics on the flushes are
+    collected in `fdb.flush_statistics`.
+
+    An FDB may be shared between threads. Archive, flush, wipe and purge are serialised on a single
+    handle. List and retrieve run concurrently, each thread using its own handle, created on demand.
     """
 
     __fdb = None
 
-    def __init__(self, config=None, user_config=None):
-        fdb = ffi.new("fdb_handle_t**")
+    def __init__(self, config=None, user_config=None, cache=None, flush_policy: Optional[FlushPolicy] = None):
+        self.cache = cache
+        self.flush_policy = flush_policy
+        self.flush_statistics = FlushStatistics()
+        self.__pending_messages = 0
+        self.__pending_bytes = 0
+        self.__last_flush = time.monotonic()
 
         if config is not None or user_config is not None:
 
@@ -357,16 +1243,30 @@ class FDB:
             config = prepare_config(config)
             user_config = prepare_config(user_config)
 
-            lib.fdb_new_handle_from_yaml(
-                fdb,
-                ffi.new("const char[]", config.encode("utf-8")),
-                ffi.new("const char[]", user_config.encode("utf-8")),
-            )
+        # Kept so that further handles onto the same FDB can be created, e.g. FDB(fdb.config, fdb.user_config)
+        self.config = config
+        self.user_config = user_config
+
+        # Identifies the configuration in cache keys, so that caches may be shared between FDBs
+        self.__config_id = json.dumps([config, user_config])
+
+        # Handle of the mutating operations, used under the lock
+        self.__lock = threading.RLock()
+        self.__fdb = self.__new_handle()
+
+        # Handles of the list and retrieve operations, by thread
+        self.__readers = {}
+        self.__local = threading.local()
+
+    def __new_handle(self):
+        fdb = ffi.new("fdb_handle_t**")
+        if self.config is not None or self.user_config is not None:
+            lib.fdb_new_handle_from_yaml(fdb, self.config.encode("utf-8"), self.user_config.encode("utf-8"))
         else:
             lib.fdb_new_handle(fdb)
 
         # Set free function
-        self.__fdb = ffi.gc(fdb[0], lib.fdb_delete_handle)
+        return _managed(fdb[0], lib.fdb_delete_handle, "fdb_handle_t")
 
     @overload
     def archive(self, data: bytes, request: Optional[Request | dict | None] = None, key: None = None) -> None: ...
@@ -414,6 +1314,19 @@ class FDB:
                 "request and key parameter are both None. Either set a request (exclusive) or a key for the given data."
             )
 
+        traced = key if isinstance(key, dict) else request if isinstance(request, dict) else None
+        with self.__lock, _span("pyfdb.archive", traced, {"fdb.bytes": len(data)}):
+            self.__archive(data, request, key)
+
+    def __archive(self, data, request, key) -> None:
+        # Counted before archiving, so that the pending counters cannot miss data already archived
+        if key:
+            messages = 1
+        elif self.flush_policy is not None and self.flush_policy.messages is not None:
+            messages = sum(1 for _ in _scan_grib(data))
+        else:
+            messages = 0
+
         if key is None:
             match request:
                 case Request():
@@ -445,86 +1358,523 @@ class FDB:
                         Please provide a valid request or consider calling the function with the `request` argument."
                     )
 
+        self.__archived(messages, len(data))
+
+    def archive_stream(
+        self,
+        source: Union[str, os.PathLike, BinaryIO],
+        chunk_size: int = 64 * 1024 * 1024,
+    ) -> int:
+        """Archive the GRIB messages of a file or stream without reading it into memory as a whole
+
+        Messages are archived in batches of contiguous messages of about `chunk_size` bytes. Local files
+        given by path are memory-mapped, and batches are passed to the FDB without being copied.
+
+        Args:
+            source: path of a file, or binary file object to read from.
+            chunk_size (int): size of the batches, and of the reads from file objects.
+
+        Returns:
+            int: the number of messages archived.
+        """
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return 0
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, self.__lock:
+                    return self.__archive_buffer(mapped, chunk_size, final=True)[0]
+
+        count = 0
+        buffer = bytearray()
+        while True:
+            chunk = source.read(chunk_size)
+            buffer += chunk
+            with self.__lock:
+                archived, end = self.__archive_buffer(buffer, chunk_size, final=not chunk)
+            count += archived
+            del buffer[:end]
+            if not chunk:
+                return count
+
+    def __archive_buffer(self, buffer, chunk_size, final) -> tuple[int, int]:
+        """Archive the complete messages in buffer, returning their number and the end of the last one"""
+        messages = [m for m in _scan_grib(buffer)]
+        if messages:
+            # A single export of the buffer, released even on error so that it may be resized or unmapped
+            with ffi.from_buffer(buffer) as data:
+                for start, end, count in _batches(messages, chunk_size):
+                    lib.fdb_archive_multiple(self.ctype, ffi.NULL, data + start, end - start)
+                    self.__archived(count, end - start)
+
+        end = messages[-1][0] + messages[-1][1] if messages else 0
+        if final and buffer.find(b"GRIB", end) != -1:
+            raise FDBException(f"Incomplete GRIB message at offset {buffer.find(b'GRIB', end)} of the stream")
+        return len(messages), end
+
     def flush(self) -> None:
         """Flush any archived data to disk"""
-        lib.fdb_flush(self.ctype)
+        with self.__lock:
+            start = time.monotonic()
+            with _span("pyfdb.flush", None, {"fdb.bytes": self.__pending_bytes}):
+                lib.fdb_flush(self.ctype)
+            self.__last_flush = time.monotonic()
+
+            self.flush_statistics.count += 1
+            self.flush_statistics.bytes.observe(self.__pending_bytes)
+            self.flush_statistics.latency.observe(self.__last_flush - start)
+            self.__pending_messages = 0
+            self.__pending_bytes = 0
+
+    def __archived(self, messages: int, nbytes: int) -> None:
+        """Account for archived data, flushing if the flush policy requires it"""
+        self.__pending_messages += messages
+        self.__pending_bytes += nbytes
+        if self.flush_policy is not None and self.flush_policy.due(
+            self.__pending_messages, self.__pending_bytes, time.monotonic() - self.__last_flush
+        ):
+            self.flush()
+
+    def close(self) -> None:
+        """Release the FDB handles immediately. The FDB cannot be used afterwards."""
+        with self.__lock:
+            if self.__fdb is not None:
+                ffi.release(self.__fdb)
+                self.__fdb = None
+            for handle in self.__readers.values():
+                ffi.release(handle)
+            self.__readers.clear()
 
-    def list(self, request=None, duplicates=False, keys=False, expand=True, depth=3) -> ListIterator:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None and self.__pending_bytes and (self.flush_policy is None or self.flush_policy.on_exit):
+                self.flush()
+        finally:
+            self.close()
+
+    def list(
+        self, request=None, duplicates=False, keys=False, expand=True, depth=3, compact=False, fields=None
+    ) -> ListIterator:
         """List entries in the FDB5 database
 
         Args:
             request (dict): dictionary representing the request.
             duplicates (bool) = false : whether to include duplicate entries.
             keys (bool) = false : whether to include the keys for each entry in the output.
+            compact (bool) = false : whether to return read-only ListEntry objects instead of dictionaries.
+                These support the same item access and hold much less memory in large listings.
+            fields (list[str], optional): if given, each entry is returned as a tuple of the values of these
+                fields, which may be key names or "path", "offset" and "length". Only these are decoded, and
+                missing fields are None.
 
         Returns:
             ListIterator: an iterator over the entries.
         """
-        return ListIterator(self, request, duplicates, keys, expand, depth)
+        return ListIterator(self, request, duplicates, keys, expand, depth, compact, fields)
+
+    def export_list(
+        self,
+        request,
+        path: Union[str, os.PathLike],
+        format: str = "jsonl",
+        compression: Optional[str] = None,
+        batch_size: int = 65536,
+        duplicates: bool = False,
+        expand: bool = True,
+    ) -> int:
+        """Write the entries matching a request, with their keys, to a file
+
+        Entries are written in batches of `batch_size` as they are listed, so memory use does not grow
+        with the number of entries. Each entry has its "path", "offset" and "length", and its keys.
+
+        Args:
+            request (dict): dictionary representing the request.
+            path (str or PathLike): file to write.
+            format (str): "jsonl", with one object per line as returned by `list(request, keys=True)`,
+                "csv", or "parquet", which requires pyarrow. In "csv" and "parquet" output, each key is a
+                column, and the columns are those of the first batch of entries.
+            compression (str, optional): "gzip", "bz2" or "xz" for "jsonl" and "csv", or any codec supported
+                by pyarrow for "parquet".
+            batch_size (int): number of entries written at once.
+
+        Raises:
+            FDBException: if, in "csv" or "parquet" output, an entry has keys not found in the first batch.
+
+        Returns:
+            int: the number of entries written.
+        """
+        if format not in ("jsonl", "csv", "parquet"):
+            raise ValueError(f"Unsupported export format {format}, expected jsonl, csv or parquet")
+
+        from .export import ListWriter
+
+        count = 0
+        writer = None
+        with ListIterator(self, request, duplicates, True, expand, compact=True) as iterator:
+            try:
+                while True:
+                    batch = [el for _, el in zip(range(batch_size), iterator)]
+                    if not batch:
+                        break
+                    if writer is None:
+                        writer = ListWriter.create(path, format, compression, batch)
+                    writer.write(batch)
+                    count += len(batch)
+            finally:
+                if writer is not None:
+                    writer.close()
+
+        if writer is None:
+            ListWriter.create(path, format, compression, []).close()
+        return count
+
+    def estimate(self, request, expand=True) -> RetrievalEstimate:
+        """Estimate the volume of a retrieval from the listing of the request, without reading any data
+
+        Fields which are adjacent in a data file are counted as a single seek, as with `retrieve_entries`.
+
+        Args:
+            request (dict): dictionary representing the request.
+
+        Returns:
+            RetrievalEstimate: the number of fields, bytes, data files and seeks.
+        """
+        files = {}
+        estimate = RetrievalEstimate()
+        with ListIterator(self, request, False, expand=expand, fields=("path", "offset", "length")) as iterator:
+            for path, offset, length in iterator:
+                files.setdefault(path, []).append((offset, length, None))
+                estimate.fields += 1
+                estimate.bytes += length
+
+        estimate.files = len(files)
+        estimate.seeks = sum(sum(1 for _ in _coalesce(ranges)) for ranges in files.values())
+        return estimate
+
+    def exists(self, request, expand=True, depth=3) -> bool:
+        """Whether any entry matches the request. Stops at the first match, without decoding it.
+
+        Args:
+            request (dict): dictionary representing the request.
+            depth (int) = 3 : depth of the schema at which to look for entries (1: databases, 2: indexes).
+        """
+        with ListIterator(self, request, False, False, expand, depth) as iterator:
+            return iterator.advance()
+
+    def count(self, request=None, duplicates=False, expand=True, depth=3) -> int:
+        """Count the entries matching the request, without decoding them
+
+        Args:
+            request (dict): dictionary representing the request.
+            duplicates (bool) = false : whether to count duplicate entries.
+            depth (int) = 3 : depth of the schema at which to count entries (1: databases, 2: indexes).
+        """
+        count = 0
+        with ListIterator(self, request, duplicates, False, expand, depth) as iterator:
+            while iterator.advance():
+                count += 1
+        return count
+
+    def axes(self, request=None, expand=True, depth=3) -> dict[str, builtins.list[str]]:
+        """The distinct values of each key among the entries matching the request
+
+        Args:
+            request (dict): dictionary representing the request.
+            depth (int) = 3 : depth of the schema down to which keys are reported. Shallower depths only
+                report the keys of the databases (1) or indexes (2), and are cheaper.
+
+        Returns:
+            dict[str, list[str]]: the values of each key, in the order in which they are first found.
+        """
+        axes = {}
+        with ListIterator(self, request, False, True, expand, depth) as iterator:
+            for el in iterator:
+                for k, v in el["keys"].items():
+                    axes.setdefault(k, {})[v] = None
+        return {k: [v for v in values] for k, values in axes.items()}
+
+    def watch(
+        self,
+        request=None,
+        interval: float = 10.0,
+        timeout: Optional[float] = None,
+        max_interval: Optional[float] = None,
+        expand=True,
+    ) -> Iterator[dict]:
+        """Poll the FDB for entries matching the request, yielding each entry once, when it first appears
+
+        The FDB C API cannot list only the entries added since a previous listing, so each poll lists the
+        whole request and costs O(N) in the number of matching entries. To keep that cost low, polls only
+        read the location (path, offset and length) of the entries, without decoding their keys. The keys
+        are listed only when a poll finds new locations, and entries are identified by a hash of their keys,
+        so that a field re-archived under the same keys is not yielded again. Only hashes of the locations
+        and keys seen are kept between polls. The polling interval doubles
+        (up to `max_interval`) while no new entries appear, and is reset when they do.
+
+        Args:
+            request (dict): dictionary representing the request.
+            interval (float): initial interval between polls, in seconds.
+            timeout (float, optional): stop watching after this many seconds.
+            max_interval (float, optional): longest interval between polls. Defaults to 8 * interval.
+
+        Returns:
+            Iterator[dict]: the new entries, as returned by `list(request, keys=True)`.
+        """
+        max_interval = max_interval if max_interval is not None else 8 * interval
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        seen = set()
+        locations = set()
+        wait = interval
+
+        while True:
+            found = False
+            with ListIterator(self, request, False, False, expand, fields=("path", "offset", "length")) as iterator:
+                changed = any(hash(location) not in locations for location in iterator)
+
+            if changed:
+                with ListIterator(self, request, False, True, expand) as iterator:
+                    for el in iterator:
+                        location = hash((el["path"], el["offset"], el["length"]))
+                        if location in locations:
+                            continue
+                        locations.add(location)
+                        key = hash(tuple(el["keys"].items()))
+                        if key not in seen:
+                            seen.add(key)
+                            found = True
+                            yield el
+
+            wait = interval if found else min(2 * wait, max_interval)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                wait = min(wait, remaining)
+            time.sleep(wait)
 
     def retrieve(self, request) -> DataRetriever:
         """Retrieve data as a stream.
 
+        If a cache is attached to the FDB, the data is served from the cache when available, and stored
+        in the cache otherwise. Requests matching no data are not cached, so that data archived later is
+        found. Cached entries are not invalidated when the FDB changes: data re-archived or wiped after it
+        was cached is served from the cache until the entry is evicted or the cache is cleared.
+
         Args:
             request (dict): dictionary representing the request.
 
         Returns:
             DataRetriever: An object implementing a file-like interface to the data stream.
         """
-        return DataRetriever(self, request)
+        if self.cache is None:
+            return DataRetriever(self, request)
+
+        key = _request_digest(request, self.__config_id)
+        cached = self.cache.get(key)
+        if cached is None:
+            # The data is streamed into the cache, which does not store empty results
+            with DataRetriever(self, request) as reader:
+                cached = self.cache.put(key, reader)
+        return cached
+
+    def retrieve_to(
+        self,
+        request,
+        destination: Union[str, os.PathLike, BinaryIO],
+        chunk_size: int = 16 * 1024 * 1024,
+        direct: bool = False,
+    ) -> TransferStatistics:
+        """Retrieve data into a file, through a single reusable buffer
+
+        Args:
+            request (dict): dictionary representing the request.
+            destination (str, PathLike or file object): file to write to. Paths are created or truncated.
+            chunk_size (int): size of the buffer through which the data is copied.
+            direct (bool) = false : copy the listed data files directly into the destination, within the
+                kernel where supported (copy_file_range or sendfile). This requires the data to be in local
+                files and the destination to be a real file, and falls back to reading through the buffer
+                otherwise. The data is written in listing order, rather than in the order of the request.
+
+        Returns:
+            TransferStatistics: the number of bytes written and the achieved throughput.
+        """
+        start = time.monotonic()
+        f = builtins.open(destination, "wb") if isinstance(destination, (str, os.PathLike)) else destination
+        try:
+            written = None
+            method = "read"
+            if direct and self.cache is None:
+                written, method = self.__copy_listed(request, f)
+
+            if written is None:
+                method = "read"
+                written = 0
+                buffer = bytearray(chunk_size)
+                view = memoryview(buffer)
+                with self.retrieve(request) as reader:
+                    while True:
+                        n = reader.readinto(buffer)
+                        if not n:
+                            break
+                        f.write(view[:n])
+                        written += n
+        finally:
+            if f is not destination:
+                f.close()
+
+        return TransferStatistics(written, time.monotonic() - start, method)
+
+    def __copy_listed(self, request, f) -> tuple[Optional[int], str]:
+        try:
+            destination = f.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            return None, "read"
+
+        entries = [(_local_path(el["path"]), el["offset"], el["length"]) for el in ListIterator(self, request, False)]
+        if not all(path is not None for path, _, _ in entries):
+            return None, "read"
+
+        f.flush()
+        written = 0
+        method = "copy_file_range"
+        sources = {}
+        try:
+            for path, offset, length in entries:
+                if path not in sources:
+                    sources[path] = os.open(path, os.O_RDONLY)
+                method = _copy_range(sources[path], destination, offset, length, method)
+                written += length
+        finally:
+            for fd in sources.values():
+                os.close(fd)
+        return written, method
+
+    def retrieve_entries(self, entries, max_gap: int = 0) -> BinaryIO:
+        """Retrieve the data of listed entries, reading their locations directly
+
+        Entries are those returned by `list`, including compact ones. The data files are read directly
+        at the listed offsets, without resolving the entries again. Reads are made in file and offset
+        order, with adjacent entries coalesced into single reads. Entries whose data is not in a local
+        file are retrieved through their keys instead, so they must have been listed with `keys=True`.
+
+        Args:
+            entries (iterable): entries returned by `list`.
+            max_gap (int) = 0 : entries separated by at most this many bytes are read together.
+
+        Returns:
+            BinaryIO: the data of the entries, concatenated in the order in which they were given.
+        """
+        chunks = []
+        files = {}
+        for index, el in enumerate(entries):
+            chunks.append(None)
+            path = _local_path(el.get("path"))
+            if path is not None:
+                files.setdefault(path, []).append((el["offset"], el["length"], index))
+                continue
+
+            keys = el.get("keys")
+            if keys is None:
+                raise FDBException(f"Entry {el} is not in a local file and has no keys to retrieve it by")
+            with DataRetriever(self, dict(keys)) as reader:
+                chunks[index] = reader.read()
+
+        for path, ranges in files.items():
+            with builtins.open(path, "rb") as f:
+                for start, end, members in _coalesce(ranges, max_gap):
+                    data = memoryview(os.pread(f.fileno(), end - start, start))
+                    if len(data) < end - start:
+                        raise FDBException(f"Data file {path} is shorter than its listed entries")
+                    for offset, length, index in members:
+                        chunks[index] = data[offset - start : offset - start + length]
+
+        return io.BytesIO(b"".join(chunks))
 
     # @todo: I believe unsafeWipeAll may do *more* than just allowing deletion of non-FDB files.
     # but it is not documented anywhere.
-    def wipe(self, request, doit=False, porcelain=False, unsafeWipeAll=False, verbose=False):
+    def wipe(self, request, doit=False, porcelain=False, unsafeWipeAll=False, verbose=False) -> HousekeepingReport:
         """Delete data matching the request from the FDB.
 
         This function identifies all entries in the database that match the given request.
-        If `doit` is False, a dry run is performed and only the entries that *would* be deleted are printed.
+        If `doit` is False, a dry run is performed and only the entries that *would* be deleted are reported.
         If `doit` is True, the matching entries are actually removed from the database.
 
         Args:
             request (dict): Dictionary representing the request.
             doit (bool, optional): If True, performs the wipe (deletes matching entries). If False, performs a dry
-              run and prints the entries that would be deleted.
-            porcelain (bool, optional): If True, prints the output of the wipe operation in a more machine-readable
-              format.
+              run and reports the entries that would be deleted.
+            porcelain (bool, optional): If True, the FDB produces its output in a more machine-readable format.
             unsafeWipeAll (bool, optional): If True, also delete non-FDB files found in the database directory.
-            verbose (bool, optional): If True, prints the output of the wipe operation even if `doit` is True.
-        """
-
-        for msg in WipeIterator(self, request, doit, porcelain, unsafeWipeAll):
-            if verbose or not doit:
-                print(msg)
+            verbose (bool, optional): If True, prints the output of the wipe operation.
 
-        # @note: It would be nice to return the URIs of the deleted files, but the output of the WipeIterator is not
-        #  structured in a way that reliably allows this.
-        return
+        Returns:
+            HousekeepingReport: the databases wiped, or to wipe.
+        """
+        with self.__lock, _span("pyfdb.wipe", request, {"fdb.doit": doit}) as span:
+            messages = WipeIterator(self, request, doit, porcelain, unsafeWipeAll)
+            report = HousekeepingReport(_parse_housekeeping(_echo(messages) if verbose else messages))
+            span.set_attribute("fdb.databases", len(report))
+        return report
 
-    def purge(self, request, doit=False, porcelain=False, verbose=False):
+    def purge(self, request, doit=False, porcelain=False, verbose=False) -> HousekeepingReport:
         """Delete *duplicate* data matching the request from the FDB. Only the newest version of the data is kept.
 
         This function identifies all entries in the database that match the given request.
-        If `doit` is False, a dry run is performed and only the entries that *would* be deleted are printed.
+        If `doit` is False, a dry run is performed and only the entries that *would* be deleted are reported.
         If `doit` is True, the matching entries are actually removed from the database.
 
         Args:
             request (dict): Dictionary representing the request.
             doit (bool, optional): If True, performs the purge (deletes matching entries). If False, performs a dry
-              run and prints the entries that would be deleted.
-            porcelain (bool, optional): If True, prints the output of the purge operation in a more machine-readable
-              format.
-            verbose (bool, optional): If True, prints the output of the purge operation even if `doit` is True.
-        """
-        for msg in PurgeIterator(self, request, doit, porcelain):
-            if verbose or not doit:
-                print(msg)
+              run and reports the entries that would be deleted.
+            porcelain (bool, optional): If True, the FDB produces its output in a more machine-readable format.
+              Note that duplicate counts are only reported without porcelain.
+            verbose (bool, optional): If True, prints the output of the purge operation.
 
-        return
+        Returns:
+            HousekeepingReport: the fields and duplicates of each database.
+        """
+        with self.__lock, _span("pyfdb.purge", request, {"fdb.doit": doit}) as span:
+            messages = PurgeIterator(self, request, doit, porcelain)
+            report = HousekeepingReport(_parse_housekeeping(_echo(messages) if verbose else messages))
+            span.set_attribute("fdb.bytes", report.duplicate_bytes)
+            span.set_attribute("fdb.databases", len(report))
+        return report
 
     @property
     def ctype(self):
+        """The handle of the mutating operations, to be used with the FDB's lock held"""
+        if self.__fdb is None:
+            raise FDBException("The FDB handle has been closed")
         return self.__fdb
 
+    @property
+    def thread_ctype(self):
+        """The handle of the list and retrieve operations of the current thread"""
+        handle = getattr(self.__local, "handle", None)
+        if handle is not None and self.__fdb is not None:
+            return handle
+
+        with self.__lock:
+            if self.__fdb is None:
+                raise FDBException("The FDB handle has been closed")
+
+            # Drop the handles of threads which have finished
+            alive = {thread.ident for thread in threading.enumerate()}
+            for ident in [ident for ident in self.__readers if ident not in alive]:
+                ffi.release(self.__readers.pop(ident))
+
+            handle = self.__local.handle = self.__readers[threading.get_ident()] = self.__new_handle()
+            return handle
+
+
+def _echo(messages):
+    for msg in messages:
+        print(msg)
+        yield msg
+
 
 fdb = None
 
@@ -551,11 +1901,11 @@ def archive(
 
 
 @wraps(FDB.list)
-def list(request, duplicates=False, keys=False, expand=True, depth=3) -> ListIterator:
+def list(request, duplicates=False, keys=False, expand=True, depth=3, compact=False, fields=None) -> ListIterator:
     global fdb
     if not fdb:
         fdb = FDB()
-    return ListIterator(fdb, request, duplicates, keys, expand, depth)
+    return ListIterator(fdb, request, duplicates, keys, expand, depth, compact, fields)
 
 
 @wraps(FDB.retrieve)
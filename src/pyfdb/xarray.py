@@ -0,0 +1,156 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+"""xarray backend for pyfdb.
+
+This module is an optional extension of pyfdb and requires xarray (and dask for chunked access).
+It is registered as the "pyfdb" engine:
+
+    import xarray as xr
+
+    ds = xr.open_dataset({...}, engine="pyfdb", chunks={})
+
+The dataset structure is built from the output of `FDB.list(request, keys=True)` without reading
+any data. Keys which take several values become dimensions, the remaining keys become attributes,
+and each value of `variable_key` (by default "param") becomes a data variable. Field values are
+only retrieved when the corresponding part of a variable is accessed, directly from the listed
+locations with `FDB.retrieve_entries`.
+"""
+
+import itertools
+from typing import Optional
+
+import numpy as np
+import xarray as xr
+from xarray.backends import BackendArray, BackendEntrypoint
+from xarray.core import indexing
+
+from .pyfdb import FDB
+
+
+class PyFDBBackendArray(BackendArray):
+    """Lazily retrieved array of fields, indexed by the values of the field dimensions"""
+
+    def __init__(self, fdb: FDB, dims: list[str], coords: list[list[str]], fields: dict, npoints: int):
+        self.fdb = fdb
+        self.dims = dims
+        self.coords = coords
+        self.fields = fields
+        self.shape = tuple(len(c) for c in coords) + (npoints,)
+        self.dtype = np.dtype(np.float64)
+
+    def __getitem__(self, key: indexing.ExplicitIndexer) -> np.ndarray:
+        return indexing.explicit_indexing_adapter(key, self.shape, indexing.IndexingSupport.BASIC, self._raw_getitem)
+
+    def _raw_getitem(self, key: tuple) -> np.ndarray:
+        # Imported on use, so that discovering the backend does not import eccodes. The FDB library
+        # itself is loaded by the pyfdb package, as for any of its modules.
+        from . import numpy as _numpy
+
+        field_key, point_key = key[:-1], key[-1]
+
+        selections = []
+        for k, size in zip(field_key, self.shape[:-1]):
+            indices = range(size)[k]
+            selections.append([indices] if isinstance(indices, int) else indices)
+
+        npoints = len(range(self.shape[-1])[point_key])
+        out = np.full(tuple(len(s) for s in selections) + (npoints,), np.nan, dtype=self.dtype)
+
+        # Only the fields touched by this selection are retrieved, together
+        positions = []
+        entries = []
+        for position in itertools.product(*(range(len(s)) for s in selections)):
+            values = tuple(self.coords[d][selections[d][p]] for d, p in enumerate(position))
+            if values in self.fields:
+                positions.append(position)
+                entries.append(self.fields[values])
+
+        if entries:
+            # FDB is thread-safe, so that chunks may be retrieved concurrently (e.g. by dask)
+            data, _ = _numpy.decode(self.fdb.retrieve_entries(entries).read())
+            for position, values in zip(positions, data):
+                out[position] = values[point_key]
+
+        squeeze = tuple(d for d, k in enumerate(field_key) if isinstance(k, int))
+        return out.squeeze(axis=squeeze) if squeeze else out
+
+
+class PyFDBBackendEntrypoint(BackendEntrypoint):
+    description = "Open FDB requests in xarray, retrieving fields lazily"
+    url = "https://github.com/ecmwf/pyfdb"
+    open_dataset_parameters = ("filename_or_obj", "drop_variables", "fdb", "variable_key")
+
+    def open_dataset(
+        self,
+        filename_or_obj,
+        *,
+        drop_variables=None,
+        fdb: Optional[FDB] = None,
+        variable_key: str = "param",
+        **kwargs,
+    ) -> xr.Dataset:
+        """Build a dataset from the fields matching a request
+
+        Args:
+            filename_or_obj (dict): dictionary representing the request.
+            drop_variables (list, optional): values of `variable_key` to leave out of the dataset.
+            fdb (FDB, optional): the FDB to read from. Defaults to a new FDB with the default configuration.
+            variable_key (str): the key whose values are used as data variables.
+        """
+        from . import numpy as _numpy
+
+        request = filename_or_obj
+        fdb = fdb if fdb is not None else FDB()
+        drop_variables = set(drop_variables or [])
+
+        entries = [el for el in fdb.list(request, keys=True)]
+        if not entries:
+            raise ValueError(f"No fields found in FDB for request {request}")
+
+        # Keys keep the order in which they are reported by the FDB schema
+        axes = {}
+        for el in entries:
+            for k, v in el["keys"].items():
+                axes.setdefault(k, {})[v] = None
+
+        variables = [v for v in axes.pop(variable_key, {None: None}) if v not in drop_variables]
+        dims = [k for k, values in axes.items() if len(values) > 1]
+        attrs = {k: next(iter(values)) for k, values in axes.items() if len(values) == 1}
+        coords = [sorted(axes[d], key=_sort_key) for d in dims]
+
+        first, _ = _numpy.decode(fdb.retrieve_entries(entries[:1]).read())
+        npoints = first.shape[1]
+
+        data_vars = {}
+        for variable in variables:
+            fields = {
+                tuple(el["keys"].get(d) for d in dims): el
+                for el in entries
+                if el["keys"].get(variable_key) == variable or variable is None
+            }
+            array = PyFDBBackendArray(fdb, dims, coords, fields, npoints)
+            data = indexing.LazilyIndexedArray(array)
+            encoding = {"preferred_chunks": dict({d: 1 for d in dims}, values=npoints)}
+            data_vars[variable or "data"] = xr.Variable(dims + ["values"], data, encoding=encoding)
+
+        coordinates = {d: _coordinate(c) for d, c in zip(dims, coords)}
+        return xr.Dataset(data_vars, coords=coordinates, attrs=attrs)
+
+    def guess_can_open(self, filename_or_obj) -> bool:
+        return isinstance(filename_or_obj, dict)
+
+
+def _sort_key(value: str):
+    return (0, int(value), value) if value.lstrip("-").isdigit() else (1, 0, value)
+
+
+def _coordinate(values: list[str]) -> np.ndarray:
+    if all(v.lstrip("-").isdigit() for v in values):
+        return np.array([int(v) for v in values])
+    return np.array(values)
@@ -6,11 +6,15 @@
 # granted to it by virtue of its status as an intergovernmental organisation
 # nor does it submit to any jurisdiction.
 
+import io
+
+import numpy as np
 import pytest
 from eccodes import StreamReader
 
+import pyfdb.grib
 import tests.util as util
-from pyfdb.pyfdb import FDB, Key, Request
+from pyfdb.pyfdb import FDB, FDBException, FlushPolicy, Key, Request
 
 STATIC_DICTIONARY = {
     "class": "rd",
@@ -158,3 +162,125 @@ def test_archive_request_dict_key_dict(setup_fdb_tmp_dir):
     fdb.flush()
 
     assert_one_field(fdb)
+
+
+def test_archive_extracted_keys(setup_fdb_tmp_dir):
+    """Keys extracted in python match those derived by the FDB library"""
+    _, fdb = setup_fdb_tmp_dir()
+    _, reference_fdb = setup_fdb_tmp_dir()
+
+    data = b"".join(
+        open(util.get_test_data_root() / filename, "rb").read() for filename in ["x138-300.grib", "x138-400.grib"]
+    )
+
+    extractor = pyfdb.grib.KeyExtractor()
+    keys = pyfdb.grib.archive(
+        data, request=dict(STATIC_DICTIONARY, levelist=["300", "400"]), fdb=fdb, extractor=extractor
+    )
+    fdb.flush()
+    reference_fdb.archive(data)
+    reference_fdb.flush()
+
+    assert [k["levelist"] for k in keys] == ["300", "400"]
+    assert [el["keys"] for el in fdb.list(keys=True)] == [el["keys"] for el in reference_fdb.list(keys=True)]
+
+    # Archiving the same messages again is served from the key cache
+    pyfdb.grib.archive(data, fdb=fdb, extractor=extractor)
+    assert (extractor.hits, extractor.misses) == (2, 2)
+
+
+def test_archive_extracted_keys_mismatch(setup_fdb_tmp_dir):
+    _, fdb = setup_fdb_tmp_dir()
+
+    data = b"".join(
+        open(util.get_test_data_root() / filename, "rb").read() for filename in ["x138-300.grib", "y138-400.grib"]
+    )
+
+    with pytest.raises(FDBException, match="message 1: expver=xxxy"):
+        pyfdb.grib.archive(data, request=dict(STATIC_DICTIONARY, levelist=["300", "400"]), fdb=fdb)
+    fdb.flush()
+
+    assert len([x for x in fdb.list()]) == 0
+
+
+def test_archive_extracted_keys_not_grib(setup_fdb_tmp_dir):
+    _, fdb = setup_fdb_tmp_dir()
+    data = open(util.get_test_data_root() / "x138-300.grib", "rb").read()
+
+    for invalid, match in [
+        (b"not grib data at all", "No GRIB messages"),
+        (b"junk" + data, "4 unrecognised bytes at offset 0"),
+        (data + b"junk" + data, f"4 unrecognised bytes at offset {len(data)}"),
+        (data + b"junk", f"4 unrecognised bytes at offset {len(data)}"),
+    ]:
+        with pytest.raises(FDBException, match=match):
+            pyfdb.grib.archive(invalid, fdb=fdb)
+    fdb.flush()
+
+    assert len([x for x in fdb.list()]) == 0
+
+
+def test_validate():
+    keys = [dict(STATIC_DICTIONARY, levelist="300"), dict(STATIC_DICTIONARY, levelist="400")]
+
+    for levelist in ["300/400", range(300, 401, 100), np.array([300, 400])]:
+        pyfdb.grib.validate(dict(STATIC_DICTIONARY, levelist=levelist, step=np.int64(0)), keys)
+
+    with pytest.raises(FDBException, match="message 1: levelist=400"):
+        pyfdb.grib.validate(dict(STATIC_DICTIONARY, levelist="300/500"), keys)
+
+
+def test_archive_stream(setup_fdb_tmp_dir, tmp_path):
+    _, fdb = setup_fdb_tmp_dir()
+
+    data = b"".join(
+        open(util.get_test_data_root() / filename, "rb").read() for filename in ["x138-300.grib", "x138-400.grib"]
+    )
+    path = tmp_path / "concatenated.grib"
+    path.write_bytes(data)
+
+    # From a path, memory-mapped, with one batch per message
+    assert fdb.archive_stream(path, chunk_size=len(data) // 2) == 2
+    fdb.flush()
+    assert len([x for x in fdb.list()]) == 2
+
+    # From a file object, read in chunks smaller than a message
+    _, fdb = setup_fdb_tmp_dir()
+    with open(path, "rb") as f:
+        assert fdb.archive_stream(f, chunk_size=1024 * 1024) == 2
+    fdb.flush()
+    assert [el["keys"]["levelist"] for el in fdb.list(keys=True)] == ["300", "400"]
+
+    # A truncated stream is reported
+    with pytest.raises(FDBException, match="Incomplete GRIB message"):
+        fdb.archive_stream(io.BytesIO(data[:-100]))
+
+
+def test_flush_policy(setup_fdb_tmp_dir):
+    _, fdb = setup_fdb_tmp_dir()
+    data = open(util.get_test_data_root() / "x138-300.grib", "rb").read()
+
+    with fdb:
+        fdb.flush_policy = FlushPolicy(messages=2)
+
+        fdb.archive(data, key=STATIC_DICTIONARY)
+        assert fdb.flush_statistics.count == 0
+        fdb.archive(data, key=dict(STATIC_DICTIONARY, step="1"))
+        assert fdb.flush_statistics.count == 1
+
+        # Messages are counted in any buffer
+        fdb.archive(memoryview(data))
+        assert fdb.flush_statistics.count == 1
+
+    # Pending data is flushed when leaving the context manager
+    assert fdb.flush_statistics.count == 2
+    assert fdb.flush_statistics.bytes.total == 3 * len(data)
+    assert sum(fdb.flush_statistics.latency.counts) == 2
+
+    fdb = FDB(fdb.config, flush_policy=FlushPolicy(bytes=len(data) + 1))
+    assert len([x for x in fdb.list()]) == 3
+
+    assert fdb.archive_stream(util.get_test_data_root() / "x138-400.grib") == 1
+    assert fdb.flush_statistics.count == 0
+    fdb.archive(data)
+    assert fdb.flush_statistics.count == 1
@@ -0,0 +1,58 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import pytest
+
+import pyfdb
+import tests.util as util
+from pyfdb.pyfdb import FDBException
+
+REQUEST = {
+    "class": "rd",
+    "date": "20191110",
+    "domain": "g",
+    "expver": "xxxx",
+    "levelist": "300",
+    "levtype": "pl",
+    "param": "138",
+    "step": "0",
+    "stream": "oper",
+    "time": "0000",
+    "type": "an",
+}
+
+
+def test_batch(setup_fdb_tmp_dir):
+    _, fdb1 = setup_fdb_tmp_dir()
+    _, fdb2 = setup_fdb_tmp_dir()
+    data = {f: open(util.get_test_data_root() / f, "rb").read() for f in ["x138-300.grib", "x138-400.grib"]}
+
+    with pyfdb.Batch(max_workers=2) as batch:
+        archived = [batch.archive(fdb1, data["x138-300.grib"]), batch.archive(fdb2, data["x138-400.grib"])]
+        retrieved = batch.retrieve(fdb1, REQUEST)
+        listed = batch.list(fdb2, dict(REQUEST, levelist="400"), keys=True)
+        failed = batch.retrieve(fdb1, dict(REQUEST, date="x"))
+        assert len(batch) == 5
+        assert not retrieved.done()
+
+    assert [f.result() for f in archived] == [None, None]
+    assert retrieved.result() == data["x138-300.grib"]
+    assert [el["keys"]["levelist"] for el in listed.result()] == ["400"]
+    with pytest.raises(FDBException):
+        failed.result()
+
+
+def test_batch_cancelled_on_error(setup_fdb_tmp_dir):
+    _, fdb = setup_fdb_tmp_dir()
+
+    with pytest.raises(RuntimeError):
+        with pyfdb.Batch() as batch:
+            future = batch.list(fdb, REQUEST)
+            raise RuntimeError()
+
+    assert future.cancelled()
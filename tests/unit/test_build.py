@@ -0,0 +1,63 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+import pyfdb
+from pyfdb._build import ffibuilder
+
+
+def mode(pythonpath=None, **env) -> str:
+    environment = dict(os.environ)
+    environment.pop("PYFDB_ABI_MODE", None)
+    environment.update(env)
+    if pythonpath is not None:
+        environment["PYTHONPATH"] = os.pathsep.join([str(pythonpath), environment.get("PYTHONPATH", "")])
+    result = subprocess.run(
+        [sys.executable, "-c", "import pyfdb; print(pyfdb.lib.mode)"],
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.strip()
+
+
+def test_abi_mode_forced():
+    assert mode(PYFDB_ABI_MODE="1") == "ABI"
+    assert mode(PYFDB_ABI_MODE="True") == "ABI"
+
+    try:
+        import pyfdb._fdb_cffi  # noqa: F401
+    except ImportError:
+        default = "ABI"
+    else:
+        default = "API"
+    assert mode() == default
+    # Only true values force ABI mode
+    assert mode(PYFDB_ABI_MODE="0") == default
+    assert mode(PYFDB_ABI_MODE="") == default
+
+
+@pytest.mark.skipif(shutil.which(os.environ.get("CC", "cc")) is None, reason="no C compiler available")
+def test_build(tmp_path):
+    # The extension is built into a copy of the package, leaving the installed one untouched
+    package = tmp_path / "site" / "pyfdb"
+    shutil.copytree(
+        os.path.dirname(pyfdb.__file__), package, ignore=shutil.ignore_patterns("__pycache__", "_fdb_cffi*")
+    )
+    ffibuilder().compile(tmpdir=str(tmp_path / "build"), target=str(package / "_fdb_cffi.*"))
+
+    assert mode(tmp_path / "site") == "API"
+    assert mode(tmp_path / "site", PYFDB_ABI_MODE="1") == "ABI"
+    assert mode(tmp_path / "site", PYFDB_ABI_MODE="0") == "API"
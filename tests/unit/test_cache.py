@@ -0,0 +1,210 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import pyfdb.numpy
+import pyfdb.pyfdb
+import tests.util as util
+from pyfdb.cache import DiskCache, SharedMemoryCache
+from pyfdb.pyfdb import _request_digest
+
+REQUEST = {
+    "class": "rd",
+    "date": "20191110",
+    "domain": "g",
+    "expver": "xxxx",
+    "levelist": "300",
+    "levtype": "pl",
+    "param": "138",
+    "step": "0",
+    "stream": "oper",
+    "time": "0000",
+    "type": "an",
+}
+
+
+def test_retrieve_from_disk_cache(setup_fdb_tmp_dir, tmp_path, monkeypatch):
+    _, fdb = setup_fdb_tmp_dir()
+    data = open(util.get_test_data_root() / "x138-300.grib", "rb").read()
+    fdb.archive(data)
+    fdb.flush()
+
+    fdb.cache = DiskCache(tmp_path / "cache", max_bytes=10 * len(data))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("DataRetriever should not be used")
+
+    # The data is streamed into the cache, rather than read into memory as a whole
+    with monkeypatch.context() as m:
+        m.setattr(pyfdb.pyfdb.DataRetriever, "read", fail)
+        with fdb.retrieve(REQUEST) as reader:
+            assert reader.read() == data
+
+    # The second retrieval, with an equivalent request, does not touch the FDB
+    monkeypatch.setattr(pyfdb.pyfdb, "DataRetriever", fail)
+    with fdb.retrieve(dict(REQUEST, step=0, LEVELIST=["300"])) as reader:
+        assert reader.read() == data
+
+
+def test_request_digest():
+    request = dict(REQUEST, levelist=["300", "400"])
+    digest = _request_digest(request)
+
+    for levelist in [[300, 400], "300/400", range(300, 401, 100), np.array([300, 400])]:
+        assert _request_digest(dict(request, levelist=levelist, step=np.int64(0))) == digest
+    assert _request_digest(dict(request, levelist=["400", "300"])) != digest
+    assert _request_digest(request, salt="other") != digest
+
+
+def test_empty_results_not_cached(setup_fdb_tmp_dir, tmp_path):
+    _, fdb = setup_fdb_tmp_dir()
+    fdb.cache = DiskCache(tmp_path / "cache", max_bytes=1024**3)
+
+    # Data archived after a retrieval which found nothing is retrieved
+    with fdb.retrieve(REQUEST) as reader:
+        assert reader.read() == b""
+
+    data = open(util.get_test_data_root() / "x138-300.grib", "rb").read()
+    fdb.archive(data)
+    fdb.flush()
+    with fdb.retrieve(REQUEST) as reader:
+        assert reader.read() == data
+
+
+def test_disk_cache_eviction(tmp_path, monkeypatch):
+    cache = DiskCache(tmp_path, max_bytes=25)
+
+    cache.put("aa01", b"x" * 10).close()
+    # The cache directory is not scanned while the entries fit within max_bytes
+    with monkeypatch.context() as m:
+        m.setattr(os, "scandir", None)
+        cache.put("aa02", b"y" * 10).close()
+        cache.put("aa02", b"y" * 10).close()
+    os.utime(tmp_path / "aa" / "aa01", (0, 0))
+
+    # aa01 is the least recently used entry, and must make room for aa03
+    cache.put("aa03", b"z" * 10).close()
+    assert cache.get("aa01") is None
+
+    with cache.get("aa02") as f:
+        assert f.read() == b"y" * 10
+    with cache.get("aa03") as f:
+        assert f.read() == b"z" * 10
+
+    cache.clear()
+    assert cache.get("aa03") is None
+
+
+def test_shared_memory_cache(setup_fdb_tmp_dir, tmp_path, monkeypatch):
+    _, fdb = setup_fdb_tmp_dir()
+    data = open(util.get_test_data_root() / "x138-300.grib", "rb").read()
+    fdb.archive(data)
+    fdb.flush()
+
+    fdb.cache = SharedMemoryCache(prefix=f"pyfdb{os.getpid()}", lock_path=tmp_path / "lock")
+
+    # The data is read directly into shared memory
+    monkeypatch.setattr(pyfdb.pyfdb.DataRetriever, "read", None)
+    with fdb.retrieve(REQUEST) as field:
+        assert field.read() == data
+
+        monkeypatch.setattr(pyfdb.pyfdb, "DataRetriever", None)
+        with fdb.retrieve(REQUEST) as shared:
+            assert shared.buffer == data
+            values, _ = pyfdb.numpy.decode(shared.buffer)
+            assert values.shape[0] == 1
+    fdb.cache.clear()
+
+
+def test_shared_memory_cache_lifetime(tmp_path):
+    # Two caches with the same prefix stand in for two processes on the same node
+    prefix = f"pyfdb{os.getpid()}"
+    cache1 = SharedMemoryCache(prefix=prefix, lock_path=tmp_path / "lock")
+    cache2 = SharedMemoryCache(prefix=prefix, lock_path=tmp_path / "lock")
+
+    field1 = cache1.put("0123", b"data")
+    with cache2.get("0123") as field2:
+        assert field2.read() == b"data"
+
+    # The entry outlives the fields, and is served to later readers
+    field1.close()
+    with cache2.get("0123") as field3:
+        assert field3.read() == b"data"
+
+        # Removing an entry leaves the fields open on it readable
+        cache1.clear()
+        assert cache2.get("0123") is None
+        assert field3.buffer == b"data"
+
+
+def test_shared_memory_cache_eviction(tmp_path):
+    header = SharedMemoryCache.HEADER.size
+    cache = SharedMemoryCache(prefix=f"pyfdb{os.getpid()}", lock_path=tmp_path / "lock", max_bytes=2 * (header + 10))
+
+    cache.put("aa01", b"x" * 10).close()
+    cache.put("aa02", b"y" * 10).close()
+    cache.get("aa01").close()
+
+    # aa02 is the least recently used entry, and must make room for aa03
+    cache.put("aa03", b"z" * 10).close()
+    assert cache.get("aa02") is None
+    with cache.get("aa01") as f:
+        assert f.read() == b"x" * 10
+    with cache.get("aa03") as f:
+        assert f.read() == b"z" * 10
+
+    cache.clear()
+    assert cache.get("aa03") is None
+
+
+def test_shared_memory_cache_crashed_writer(tmp_path):
+    prefix = f"pyfdb{os.getpid()}"
+    # The writer dies after creating the segment, before marking it as ready
+    crash = f"""
+import os
+import pyfdb.cache
+enter = pyfdb.cache._FileLock.__enter__
+calls = []
+def crash(self):
+    calls.append(self)
+    if len(calls) > 1:
+        os._exit(1)
+    return enter(self)
+pyfdb.cache._FileLock.__enter__ = crash
+pyfdb.cache.SharedMemoryCache(prefix={prefix!r}, lock_path={str(tmp_path / "lock")!r}).put("0123", b"data")
+"""
+    assert subprocess.run([sys.executable, "-c", crash]).returncode == 1
+
+    # The incomplete entry is reclaimed instead of blocking the key
+    cache = SharedMemoryCache(prefix=prefix, lock_path=tmp_path / "lock")
+    with cache.put("0123", b"data") as field:
+        assert field.buffer == b"data"
+    with cache.get("0123") as field:
+        assert field.read() == b"data"
+    cache.clear()
+
+
+def test_shared_memory_cache_names(tmp_path):
+    cache = SharedMemoryCache(prefix=f"pyfdb{os.getpid()}", lock_path=tmp_path / "lock")
+
+    # Keys sharing a long common prefix are held in distinct segments
+    key1, key2 = "0" * 63 + "1", "0" * 63 + "2"
+    with cache.put(key1, b"data1"), cache.put(key2, b"data2"):
+        with cache.get(key1) as field1, cache.get(key2) as field2:
+            assert field1.read() == b"data1"
+            assert field2.read() == b"data2"
+    cache.clear()
+
+    with pytest.raises(ValueError):
+        SharedMemoryCache(prefix="postprocessing_node_cache")
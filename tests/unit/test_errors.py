@@ -0,0 +1,49 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from pyfdb.pyfdb import FDBException, Request
+
+
+def test_error_context():
+    with pytest.raises(FDBException) as e:
+        Request({"class": "rd", "date": "x"}).expand()
+
+    assert e.value.function == "fdb_expand_request"
+    assert e.value.code == 1
+    assert "UserError" in str(e.value)
+
+
+def test_error_context_per_thread():
+    errors = []
+
+    def expand(date):
+        try:
+            Request({"class": "rd", "date": date}).expand()
+        except FDBException as e:
+            errors.append((date, str(e)))
+
+    threads = [threading.Thread(target=expand, args=(date,)) for date in ["x", "yy"]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 2
+    for date, message in errors:
+        assert f"date={date}" in message
+
+
+def test_import_is_silent():
+    result = subprocess.run([sys.executable, "-c", "import pyfdb"], capture_output=True, text=True, check=True)
+    assert result.stdout == ""
@@ -0,0 +1,66 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import pytest
+
+import pyfdb
+import tests.util as util
+from pyfdb.pyfdb import FDBException, PurgeIterator, WipeIterator
+
+REQUEST = {
+    "class": "rd",
+    "date": "20191110",
+    "domain": "g",
+    "expver": "xxxx",
+    "levelist": "300",
+    "levtype": "pl",
+    "param": "138",
+    "step": "0",
+    "stream": "oper",
+    "time": "0000",
+    "type": "an",
+}
+
+
+@pytest.fixture
+def tracking():
+    yield pyfdb.track_handles
+    pyfdb.track_handles(False)
+
+
+def test_deterministic_release(setup_fdb_tmp_dir, tracking):
+    _, fdb = setup_fdb_tmp_dir()
+    fdb.archive(open(util.get_test_data_root() / "x138-300.grib", "rb").read())
+    fdb.flush()
+
+    tracking()
+    with pyfdb.FDB(fdb.config) as tracked_fdb:
+        assert pyfdb.live_handles() == {"fdb_handle_t": 1}
+
+        with tracked_fdb.retrieve(REQUEST) as reader:
+            reader.read(10)
+            assert pyfdb.live_handles()["fdb_datareader_t"] == 1
+        assert "fdb_datareader_t" not in pyfdb.live_handles()
+        with pytest.raises(ValueError):
+            reader.read(10)
+
+        with tracked_fdb.list(REQUEST, keys=True) as iterator:
+            next(iterator)
+            assert pyfdb.live_handles()["fdb_listiterator_t"] == 1
+        assert "fdb_listiterator_t" not in pyfdb.live_handles()
+        assert [x for x in iterator] == []
+
+        for cls, args in [(WipeIterator, (False, False, False)), (PurgeIterator, (False, False))]:
+            with cls(tracked_fdb, {"class": "rd"}, *args) as iterator:
+                assert [msg for msg in iterator]
+            # The handle of the FDB, and that with which this thread listed and retrieved
+            assert pyfdb.live_handles() == {"fdb_handle_t": 2}
+
+    assert pyfdb.live_handles() == {}
+    with pytest.raises(FDBException):
+        tracked_fdb.list(REQUEST)
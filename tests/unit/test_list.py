@@ -0,0 +1,181 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import csv
+import gzip
+import json
+import time
+
+import numpy as np
+import pytest
+
+import pyfdb.pyfdb
+import tests.util as util
+from pyfdb.export import ListWriter
+from pyfdb.pyfdb import _encode_values
+
+REQUEST = {
+    "class": "rd",
+    "date": "20191110",
+    "domain": "g",
+    "expver": "xxxx",
+    "levelist": ["300", "400"],
+    "levtype": "pl",
+    "param": "138",
+    "step": "0",
+    "stream": "oper",
+    "time": "0000",
+    "type": "an",
+}
+
+
+@pytest.fixture
+def populated_fdb(setup_fdb_tmp_dir):
+    _, fdb = setup_fdb_tmp_dir()
+    for filename in ["x138-300.grib", "x138-400.grib", "y138-400.grib"]:
+        fdb.archive(open(util.get_test_data_root() / filename, "rb").read())
+    fdb.flush()
+    return fdb
+
+
+def test_exists_and_count(populated_fdb):
+    fdb = populated_fdb
+
+    assert fdb.exists(REQUEST)
+    assert not fdb.exists(dict(REQUEST, levelist="500"))
+
+    assert fdb.count(REQUEST) == 2
+    assert fdb.count(dict(REQUEST, levelist="500")) == 0
+    assert fdb.count() == 3
+    assert fdb.count(depth=1) == 2
+
+
+def test_axes(populated_fdb):
+    fdb = populated_fdb
+
+    axes = fdb.axes()
+    assert axes["expver"] == ["xxxx", "xxxy"]
+    assert axes["levelist"] == ["300", "400"]
+    assert axes["param"] == ["138"]
+
+    axes = fdb.axes(depth=1)
+    assert axes["expver"] == ["xxxx", "xxxy"]
+    assert "levelist" not in axes
+
+
+def test_watch(setup_fdb_tmp_dir, monkeypatch):
+    _, fdb = setup_fdb_tmp_dir()
+    data = open(util.get_test_data_root() / "x138-300.grib", "rb").read()
+    fdb.archive(data)
+    fdb.flush()
+
+    sleeps = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+
+    # Keys are only listed by the polls which find new entries
+    keyed = []
+    list_iterator = pyfdb.pyfdb.ListIterator
+    monkeypatch.setattr(
+        pyfdb.pyfdb, "ListIterator", lambda *args, **kwargs: keyed.append(args[3]) or list_iterator(*args, **kwargs)
+    )
+
+    watcher = fdb.watch(REQUEST, interval=1, max_interval=3, timeout=60)
+    assert next(watcher)["keys"]["levelist"] == "300"
+
+    # Archive the next field once the watcher has polled twice without finding anything new
+    def archive_later(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 3:
+            fdb.archive(open(util.get_test_data_root() / "x138-400.grib", "rb").read())
+            fdb.flush()
+
+    monkeypatch.setattr(time, "sleep", archive_later)
+    assert next(watcher)["keys"]["levelist"] == "400"
+    assert sleeps == [1, 2, 3]
+    assert keyed == [False, True, False, False, False, True]
+
+
+def test_list_compact(populated_fdb):
+    fdb = populated_fdb
+
+    entries = [el for el in fdb.list(keys=True)]
+    compact = [el for el in fdb.list(keys=True, compact=True)]
+
+    assert compact == entries
+    assert compact[0]["keys"]["levelist"] == "300"
+    assert compact[0].path == entries[0]["path"]
+    assert dict(compact[1]["keys"]) == entries[1]["keys"]
+
+    # Entries with the same keys share the key names, and entries in the same file the path
+    assert compact[0]["keys"]._names is compact[1]["keys"]._names
+    assert compact[0].path is compact[1].path
+
+    with pytest.raises(AttributeError):
+        compact[0].extra = 1
+
+    shallow = [el for el in fdb.list(keys=True, depth=1, compact=True)]
+    assert "path" not in shallow[0]
+    assert shallow == [el for el in fdb.list(keys=True, depth=1)]
+
+
+def test_list_fields(populated_fdb):
+    fdb = populated_fdb
+
+    assert [x for x in fdb.list(fields=["expver", "levelist"])] == [("xxxx", "300"), ("xxxx", "400"), ("xxxy", "400")]
+
+    entries = [el for el in fdb.list()]
+    projected = [x for x in fdb.list(REQUEST, fields=["length", "param", "path", "unknown"])]
+    assert projected == [(el["length"], "138", el["path"], None) for el in entries[:2]]
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_export_list(populated_fdb, tmp_path, compression):
+    fdb = populated_fdb
+    entries = [el for el in fdb.list(keys=True)]
+    opener = gzip.open if compression else open
+
+    assert fdb.export_list(None, tmp_path / "list.jsonl", compression=compression, batch_size=2) == 3
+    with opener(tmp_path / "list.jsonl", "rt") as f:
+        assert [json.loads(line) for line in f] == entries
+
+    assert fdb.export_list(None, tmp_path / "list.csv", format="csv", compression=compression, batch_size=2) == 3
+    with opener(tmp_path / "list.csv", "rt") as f:
+        rows = [row for row in csv.DictReader(f)]
+    assert [row["path"] for row in rows] == [el["path"] for el in entries]
+    assert [row["levelist"] for row in rows] == ["300", "400", "400"]
+
+
+def test_export_writers():
+    # The writers and their dependencies are kept out of the pyfdb namespace
+    assert not hasattr(pyfdb, "gzip") and not hasattr(pyfdb, "csv")
+
+    with pytest.raises(TypeError):
+        ListWriter(None, None, ListWriter.COLUMNS)
+
+
+def test_export_list_parquet(populated_fdb, tmp_path):
+    parquet = pytest.importorskip("pyarrow.parquet")
+
+    assert populated_fdb.export_list(None, tmp_path / "list.parquet", format="parquet", batch_size=2) == 3
+    table = parquet.read_table(tmp_path / "list.parquet")
+    assert table.column("expver").to_pylist() == ["xxxx", "xxxx", "xxxy"]
+
+
+def test_request_values(populated_fdb):
+    fdb = populated_fdb
+    request = dict(REQUEST, expver="xxxx")
+
+    for levelist in [range(300, 401, 100), range(100, 1000, 100), np.array([300, 400]), "300/400", "300/to/400/by/100"]:
+        assert fdb.axes(dict(request, levelist=levelist))["levelist"] == ["300", "400"]
+
+    # Ranges of keys without "to/by" support are passed value by value
+    assert fdb.count(dict(request, levelist=range(300, 401, 100), param=range(130, 140))) == 2
+
+    assert _encode_values(range(0, 240, 3), ranges=True) == [b"0", b"to", b"237", b"by", b"3"]
+    assert _encode_values(range(0, 9, 3)) == [b"0", b"3", b"6"]
+    assert _encode_values(np.int64(6)) == [b"6"]
@@ -0,0 +1,86 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import eccodes
+import numpy as np
+from eccodes import StreamReader
+
+import pyfdb.numpy
+import tests.util as util
+from pyfdb.pyfdb import _scan_grib
+
+REQUEST = {
+    "class": "rd",
+    "date": "20191110",
+    "domain": "g",
+    "expver": "xxxx",
+    "levelist": ["400", "300"],
+    "levtype": "pl",
+    "param": "138",
+    "step": "0",
+    "stream": "oper",
+    "time": "0000",
+    "type": "an",
+}
+
+
+def reference_values(filename):
+    with open(util.get_test_data_root() / filename, "rb") as f:
+        return next(StreamReader(f)).data
+
+
+def test_numpy_retrieve(setup_fdb_tmp_dir):
+    _, fdb = setup_fdb_tmp_dir()
+
+    for filename in ["x138-300.grib", "x138-400.grib"]:
+        fdb.archive(open(util.get_test_data_root() / filename, "rb").read())
+    fdb.flush()
+
+    values, metadata = pyfdb.numpy.retrieve(REQUEST, fdb=fdb, max_workers=2)
+
+    assert values.shape[0] == 2
+    assert [m["levelist"] for m in metadata] == ["400", "300"]
+    assert np.array_equal(values[0], reference_values("x138-400.grib"))
+    assert np.array_equal(values[1], reference_values("x138-300.grib"))
+
+    values, metadata = pyfdb.numpy.retrieve(REQUEST, fdb=fdb, keys=["shortName"], dtype=np.float32)
+    assert values.dtype == np.float32
+    assert metadata == [{"shortName": "vo"}, {"shortName": "vo"}]
+
+
+def test_numpy_decode_buffer():
+    data = open(util.get_test_data_root() / "x138-300.grib", "rb").read()
+
+    # Bytes between messages are skipped
+    values, metadata = pyfdb.numpy.decode(data + b"padding" + data)
+
+    assert values.shape[0] == 2
+    assert np.array_equal(values[0], values[1])
+    assert metadata[0]["levelist"] == "300"
+
+    # Any buffer is accepted, e.g. a zero-copy view of a SharedField
+    decoded, _ = pyfdb.numpy.decode(memoryview(data + data)[len(data) :])
+    assert np.array_equal(decoded[0], values[0])
+
+
+def test_numpy_decode_large_grib1():
+    # A GRIB1 message of 8 to 16 MiB sets the top bit of its 24-bit length without other meaning
+    handle = eccodes.codes_grib_new_from_samples("GRIB1")
+    try:
+        eccodes.codes_set(handle, "Ni", 1500)
+        eccodes.codes_set(handle, "Nj", 1500)
+        eccodes.codes_set(handle, "bitsPerValue", 32)
+        eccodes.codes_set_values(handle, np.linspace(0, 1, 1500 * 1500))
+        data = eccodes.codes_get_message(handle)
+    finally:
+        eccodes.codes_release(handle)
+    assert 8 * 1024**2 < len(data) < 16 * 1024**2
+
+    assert [m for m in _scan_grib(data + data)] == [(0, len(data)), (len(data), len(data))]
+    values, _ = pyfdb.numpy.decode(data)
+    assert values.shape == (1, 1500 * 1500)
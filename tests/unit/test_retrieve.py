@@ -0,0 +1,156 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import io
+
+import pytest
+
+import pyfdb.pyfdb
+import tests.util as util
+from pyfdb.pyfdb import AdaptiveReader, FDBException, _coalesce, _local_path
+
+FILES = ["x138-300.grib", "x138-400.grib", "y138-400.grib"]
+
+
+@pytest.fixture
+def populated_fdb(setup_fdb_tmp_dir):
+    _, fdb = setup_fdb_tmp_dir()
+    for filename in FILES:
+        fdb.archive(open(util.get_test_data_root() / filename, "rb").read())
+    fdb.flush()
+    return fdb
+
+
+def test_retrieve_entries(populated_fdb):
+    fdb = populated_fdb
+    expected = {f: open(util.get_test_data_root() / f, "rb").read() for f in FILES}
+
+    entries = [el for el in fdb.list(keys=True)]
+    assert fdb.retrieve_entries(entries).read() == b"".join(expected[f] for f in FILES)
+
+    # Data is returned in the order of the entries, and compact entries are accepted
+    compact = [el for el in fdb.list(keys=True, compact=True)]
+    assert fdb.retrieve_entries(compact[::-1]).read() == b"".join(expected[f] for f in FILES[::-1])
+
+    # Listed paths may be "file://" URIs of local files
+    uri = dict(entries[1], path="file://" + entries[1]["path"])
+    assert fdb.retrieve_entries([uri]).read() == expected[FILES[1]]
+
+    # Entries which are not in a local file are retrieved by their keys
+    moved = dict(entries[1], path="/nonexistent/data")
+    assert fdb.retrieve_entries([moved]).read() == expected[FILES[1]]
+
+    with pytest.raises(FDBException):
+        fdb.retrieve_entries([{"path": "/nonexistent/data", "offset": 0, "length": 10}])
+
+
+def test_local_path(tmp_path):
+    path = tmp_path / "data"
+    path.write_bytes(b"GRIB")
+    assert _local_path(str(path)) == str(path)
+    assert _local_path(f"file://{path}") == str(path)
+    assert _local_path(f"file:{path}") == str(path)
+    assert _local_path(str(tmp_path)) is None
+    assert _local_path("/nonexistent/data") is None
+    assert _local_path(None) is None
+
+
+def test_coalesce():
+    ranges = [(100, 50, 0), (0, 50, 1), (50, 50, 2), (160, 40, 3)]
+    assert [(s, e, [i for _, _, i in m]) for s, e, m in _coalesce(ranges)] == [(0, 150, [1, 2, 0]), (160, 200, [3])]
+    assert [(s, e) for s, e, _ in _coalesce(ranges, max_gap=10)] == [(0, 200)]
+
+
+@pytest.mark.parametrize("direct", [False, True])
+def test_retrieve_to(populated_fdb, tmp_path, direct):
+    fdb = populated_fdb
+    expected = b"".join(open(util.get_test_data_root() / f, "rb").read() for f in FILES[:2])
+    request = {
+        "class": "rd",
+        "date": "20191110",
+        "domain": "g",
+        "expver": "xxxx",
+        "levelist": ["300", "400"],
+        "levtype": "pl",
+        "param": "138",
+        "step": "0",
+        "stream": "oper",
+        "time": "0000",
+        "type": "an",
+    }
+
+    statistics = fdb.retrieve_to(request, tmp_path / "out.grib", chunk_size=1024 * 1024, direct=direct)
+    assert (tmp_path / "out.grib").read_bytes() == expected
+    assert statistics.bytes == len(expected)
+    assert statistics.method != "read" if direct else statistics.method == "read"
+
+    # File objects without a file descriptor are written through the buffer
+    out = io.BytesIO()
+    statistics = fdb.retrieve_to(request, out, direct=direct)
+    assert out.getvalue() == expected
+    assert statistics.method == "read"
+
+
+def test_estimate(populated_fdb):
+    fdb = populated_fdb
+    sizes = [len(open(util.get_test_data_root() / f, "rb").read()) for f in FILES]
+
+    estimate = fdb.estimate({"class": "rd"})
+    assert (estimate.fields, estimate.bytes) == (3, sum(sizes))
+    # One data file per database, in which the fields of xxxx are contiguous
+    assert (estimate.files, estimate.seeks) == (2, 2)
+
+    estimate = fdb.estimate({"class": "rd", "expver": "xxxx", "levelist": "500"})
+    assert (estimate.fields, estimate.bytes, estimate.files, estimate.seeks) == (0, 0, 0, 0)
+
+
+def test_adaptive_reader(populated_fdb):
+    fdb = populated_fdb
+    expected = open(util.get_test_data_root() / FILES[0], "rb").read()
+    request = {
+        "class": "rd",
+        "date": "20191110",
+        "domain": "g",
+        "expver": "xxxx",
+        "levelist": "300",
+        "levtype": "pl",
+        "param": "138",
+        "step": "0",
+        "stream": "oper",
+        "time": "0000",
+        "type": "an",
+    }
+
+    raw = AdaptiveReader(fdb.retrieve(request), min_chunk_size=4096, max_chunk_size=65536)
+    with io.BufferedReader(raw, buffer_size=65536) as reader:
+        chunks = [reader.read(1000) for _ in range(10)]
+        assert b"".join(chunks) + reader.read() == expected
+    assert 4096 <= raw.chunk_size <= 65536
+    assert raw.bytes == len(expected) and raw.bandwidth > 0
+
+    with AdaptiveReader(fdb.retrieve(request)) as reader:
+        assert reader.read() == expected
+
+
+def test_adaptive_chunk_size(monkeypatch):
+    clock = [0.0]
+
+    class Source(io.RawIOBase):
+        # 1ms latency per read, then 1 GB/s
+        def readinto(self, buffer):
+            clock[0] += 0.001 + len(buffer) / 1e9
+            return len(buffer)
+
+    monkeypatch.setattr(pyfdb.pyfdb.time, "perf_counter", lambda: clock[0])
+    reader = AdaptiveReader(Source(), min_chunk_size=256 * 1024, max_chunk_size=64 * 1024 * 1024)
+    buffer = bytearray(64 * 1024 * 1024)
+    for _ in range(20):
+        reader.readinto(buffer)
+
+    # Doubling from 8 MiB to 16 MiB improves the throughput by less than 10%
+    assert reader.chunk_size == 8 * 1024 * 1024
@@ -0,0 +1,44 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+from concurrent.futures import ThreadPoolExecutor
+
+import tests.util as util
+
+KEY = {
+    "class": "rd",
+    "date": "20191110",
+    "domain": "g",
+    "expver": "xxxx",
+    "levelist": "300",
+    "levtype": "pl",
+    "param": "138",
+    "stream": "oper",
+    "time": "0000",
+    "type": "an",
+}
+
+
+def test_shared_fdb(setup_fdb_tmp_dir):
+    _, fdb = setup_fdb_tmp_dir()
+    data = open(util.get_test_data_root() / "x138-300.grib", "rb").read()
+    steps = [str(step) for step in range(0, 48, 3)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for _ in executor.map(lambda step: fdb.archive(data, key=dict(KEY, step=step)), steps):
+            pass
+        fdb.flush()
+
+        def read(step):
+            with fdb.retrieve(dict(KEY, step=step)) as reader:
+                return len([el for el in fdb.list(dict(KEY, step=step))]), reader.read()
+
+        assert [result for result in executor.map(read, steps)] == [(1, data)] * len(steps)
+
+    assert fdb.count(dict(KEY, step=steps)) == len(steps)
+    fdb.close()
@@ -0,0 +1,113 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import contextlib
+
+import pytest
+
+import pyfdb
+import tests.util as util
+
+REQUEST = {
+    "class": "rd",
+    "date": "20191110",
+    "domain": "g",
+    "expver": "xxxx",
+    "levelist": ["300", "400"],
+    "levtype": "pl",
+    "param": "138",
+    "step": "0",
+    "stream": "oper",
+    "time": "0000",
+    "type": "an",
+}
+
+
+class Span:
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.ended = False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def add_event(self, name, attributes=None):
+        self.events.append(name)
+
+    def end(self):
+        self.ended = True
+
+
+class Tracer:
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, attributes=None):
+        self.spans.append(Span(name, attributes))
+        return self.spans[-1]
+
+    @contextlib.contextmanager
+    def start_as_current_span(self, name, attributes=None):
+        span = self.start_span(name, attributes)
+        yield span
+        span.end()
+
+    def find(self, name):
+        return [span for span in self.spans if span.name == name]
+
+
+@pytest.fixture
+def tracer():
+    tracer = Tracer()
+    pyfdb.set_tracer(tracer)
+    yield tracer
+    pyfdb.set_tracer(None)
+
+
+def test_spans(setup_fdb_tmp_dir, tracer):
+    _, fdb = setup_fdb_tmp_dir()
+
+    data = open(util.get_test_data_root() / "x138-300.grib", "rb").read()
+    fdb.archive(data)
+    fdb.flush()
+    assert tracer.find("pyfdb.archive")[0].attributes["fdb.bytes"] == len(data)
+    assert tracer.find("pyfdb.flush")[0].attributes["fdb.bytes"] == len(data)
+
+    assert len([el for el in fdb.list(REQUEST)]) == 1
+    (span,) = tracer.find("pyfdb.list")
+    assert span.attributes["fdb.request.levelist"] == "300/400"
+    assert len(tracer.find("pyfdb.request.expand")) == 1
+
+    with fdb.retrieve(REQUEST) as reader:
+        reader.read()
+    assert tracer.find("pyfdb.retrieve")[0].attributes["fdb.request.param"] == "138"
+    (transfer,) = tracer.find("pyfdb.retrieve.transfer")
+    assert transfer.ended
+    assert transfer.events == ["first_byte"]
+    assert transfer.attributes["fdb.bytes"] == len(data)
+
+    fdb.archive(data)
+    fdb.flush()
+    fdb.purge({"class": "rd", "expver": "xxxx"})
+    assert tracer.find("pyfdb.purge")[0].attributes["fdb.bytes"] == len(data)
+
+    fdb.wipe(REQUEST)
+    assert tracer.find("pyfdb.wipe")[0].attributes["fdb.databases"] == 1
+    assert all(span.ended for span in tracer.spans)
+
+
+def test_no_tracer(setup_fdb_tmp_dir):
+    _, fdb = setup_fdb_tmp_dir()
+    tracer = Tracer()
+    pyfdb.set_tracer(tracer)
+    pyfdb.set_tracer(None)
+
+    assert [el for el in fdb.list(REQUEST)] == []
+    assert tracer.spans == []
@@ -10,6 +10,7 @@ from pathlib import Path
 
 import pytest
 
+from pyfdb.housekeeping import HousekeepingExecutor
 from pyfdb.pyfdb import FDBException
 
 BASE_REQUEST = {
@@ -127,3 +128,62 @@ def test_purge(setup_fdb_tmp_dir):
 
     fdb.purge({"class": "rd"}, doit=True)
     assert len([x for x in fdb.list()]) == n_written  # @FIXME: fdb.list should require duplicates=True
+
+
+def test_wipe_report(setup_fdb_tmp_dir, capsys):
+    _, fdb = setup_fdb_tmp_dir()
+    populate_fdb(fdb)
+
+    report = fdb.wipe({"class": "rd"})
+
+    assert {db.database for db in report} == {"rd:xxxx:oper:20000101:0000:g", "rd:xxxx:oper:20000102:0000:g"}
+    assert all(db.owner for db in report)
+    assert capsys.readouterr().out == ""
+
+    report = fdb.wipe({"class": "rd"}, doit=True, verbose=True)
+    assert len(report) == 2
+    assert "Database: rd:xxxx:oper:20000101:0000:g" in capsys.readouterr().out
+
+
+def test_purge_report(setup_fdb_tmp_dir):
+    _, fdb = setup_fdb_tmp_dir()
+    populate_fdb(fdb)
+    populate_fdb(fdb)
+
+    report = fdb.purge({"class": "rd"})
+
+    assert len(report) == 2
+    assert report.fields == 8
+    assert report.duplicates == 4
+    assert report.duplicate_bytes == 4 * len(b"-1 Kelvin")
+
+    fdb.purge({"class": "rd"}, doit=True)
+    assert fdb.purge({"class": "rd"}).duplicates == 0
+
+
+def test_housekeeping_executor(setup_fdb_tmp_dir):
+    testdir, fdb = setup_fdb_tmp_dir()
+    populate_fdb(fdb)
+    populate_fdb(fdb)
+
+    updates = []
+    executor = HousekeepingExecutor(
+        fdb, max_workers=2, progress=lambda p: updates.append((p.done, p.total, p.bytes, p.duplicate_bytes))
+    )
+
+    estimate = executor.estimate({"class": "rd"}, purge=True)
+    assert estimate.duplicates == 4
+    assert len([x for x in fdb.list()]) == 8
+
+    report = executor.purge({"class": "rd"}, doit=True)
+    assert len(report) == 2
+    assert len([x for x in fdb.list()]) == 4
+    assert [u[:2] for u in updates[-2:]] == [(1, 2), (2, 2)]
+    assert updates[-1][2:] == (0, 4 * len(b"-1 Kelvin"))
+
+    updates.clear()
+    executor.wipe({"class": "rd"}, doit=True)
+    assert len([x for x in fdb.list()]) == 0
+    assert [u[:2] for u in updates] == [(1, 2), (2, 2)]
+    assert updates[-1][2:] == (4 * len(b"-1 Kelvin"), 0)
+    assert len(ls(testdir)) == 0
@@ -0,0 +1,79 @@
+# (C) Copyright 2011- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from eccodes import StreamReader
+
+import tests.util as util
+
+xr = pytest.importorskip("xarray")
+pytest.importorskip("dask")
+
+REQUEST = {
+    "class": "rd",
+    "date": "20191110",
+    "domain": "g",
+    "expver": "xxxx",
+    "levelist": ["300", "400"],
+    "levtype": "pl",
+    "param": "138",
+    "step": ["0", "6"],
+    "stream": "oper",
+    "time": "0000",
+    "type": "an",
+}
+
+
+def test_open_dataset_lazily(setup_fdb_tmp_dir, monkeypatch):
+    _, fdb = setup_fdb_tmp_dir()
+
+    for filename in ["x138-300.grib", "x138-400.grib"]:
+        fdb.archive(open(util.get_test_data_root() / filename, "rb").read())
+    data = open(util.get_test_data_root() / "x138-400.grib", "rb").read()
+    fdb.archive(data, key=dict(REQUEST, levelist="300", step="6"))
+    fdb.flush()
+
+    ds = xr.open_dataset(REQUEST, engine="pyfdb", fdb=fdb, chunks={})
+
+    assert list(ds.data_vars) == ["138"]
+    assert ds["138"].dims == ("levelist", "step", "values")
+    assert list(ds["levelist"].values) == [300, 400]
+    assert ds.attrs["type"] == "an"
+
+    retrieved = []
+    retrieve_entries = fdb.retrieve_entries
+    monkeypatch.setattr(fdb, "retrieve_entries", lambda entries: retrieved.extend(entries) or retrieve_entries(entries))
+
+    field = ds["138"].sel(levelist=300, step=6).values
+    assert len(retrieved) == 1
+
+    with open(util.get_test_data_root() / "x138-400.grib", "rb") as f:
+        assert np.array_equal(field, next(StreamReader(f)).data)
+
+    # Fields missing from the FDB are filled with NaN
+    assert np.isnan(ds["138"].sel(levelist=400, step=6).values).all()
+
+    # Chunks are retrieved concurrently by the threaded scheduler
+    values = ds["138"].compute(scheduler="threads").values
+    assert np.array_equal(values[0, 1], field)
+    assert np.isnan(values[1, 1]).all()
+
+
+def test_backend_discovery_is_light():
+    # xarray imports every installed backend, so the decoding dependencies are only imported on use.
+    # The FDB library is loaded by the pyfdb package.
+    check = (
+        "import sys, pyfdb.xarray; "
+        "assert 'eccodes' not in sys.modules and 'pyfdb.numpy' not in sys.modules; "
+        "assert 'pyfdb.pyfdb' in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", check], check=True)